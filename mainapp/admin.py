@@ -6,6 +6,7 @@ from PIL import Image
 from io import BytesIO
 from django.core.files.uploadedfile import InMemoryUploadedFile
 import sys
+from .order_status import bulk_transition
 
 
 class OrderInline(admin.TabularInline):
@@ -19,9 +20,70 @@ class CustomerAdmin(admin.ModelAdmin):
     ]
 
 
+class OrderLineInline(admin.TabularInline):
+    model = OrderLine
+    extra = 0
+    readonly_fields = ['product_type', 'product_id', 'title', 'image', 'unit_price', 'qty', 'final_price']
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+def make_transition_action(to_status):
+
+    def transition_orders(modeladmin, request, queryset):
+        changed = 0
+        for from_status, allowed in Order.STATUS_TRANSITIONS.items():
+            if to_status in allowed:
+                changed += len(bulk_transition(queryset, from_status, to_status))
+        modeladmin.message_user(request, f'Переведено заказов: {changed} из {queryset.count()}')
+
+    transition_orders.__name__ = f'transition_to_{to_status}'
+    transition_orders.short_description = 'Перевести в статус "{}"'.format(dict(Order.STATUS_CHOICES)[to_status])
+    return transition_orders
+
+
+class OrderStatusEventInline(admin.TabularInline):
+    model = OrderStatusEvent
+    extra = 0
+    readonly_fields = ['from_status', 'to_status', 'created_at']
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class DeliverySlotAdmin(admin.ModelAdmin):
+
+    list_display = ['date', 'start_time', 'end_time', 'capacity', 'available']
+    list_filter = ['date']
+
+
+class OrderAdmin(admin.ModelAdmin):
+
+    list_display = ['id', 'first_name', 'last_name', 'status', 'created_at']
+    list_filter = ['status']
+    readonly_fields = ['slot']
+    actions = [make_transition_action(status) for status, _ in Order.STATUS_CHOICES if status != Order.STATUS_NEW]
+    inlines = [
+        OrderLineInline,
+        OrderStatusEventInline
+    ]
+
+
 class CartProductInline(admin.TabularInline):
     model = CartProduct
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('content_object')
+
+
+class CartProductAdmin(admin.ModelAdmin):
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('content_object')
+
 
 class CartAdmin(admin.ModelAdmin):
     inlines = [
@@ -64,7 +126,7 @@ class PizzaAdmin(admin.ModelAdmin):
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         if db_field.name == 'category':
-            return ModelChoiceField(Category.objects.filter(slug='pizza'))
+            return ModelChoiceField(Category.objects.filter(slug=PizzaProduct.CATEGORY_SLUG))
         return super().formfirled_for_foreignkey(db_field, request, **kwargs)
     
     
@@ -77,14 +139,15 @@ class BeerAdmin(admin.ModelAdmin):
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         if db_field.name == 'category':
-            return ModelChoiceField(Category.objects.filter(slug='beer'))
+            return ModelChoiceField(Category.objects.filter(slug=BeerProduct.CATEGORY_SLUG))
         return super().formfirled_for_foreignkey(db_field, request, **kwargs)
 
 
 admin.site.register(Category)
 admin.site.register(PizzaProduct, PizzaAdmin)
 admin.site.register(BeerProduct, BeerAdmin)
-admin.site.register(CartProduct)
+admin.site.register(CartProduct, CartProductAdmin)
 admin.site.register(Cart, CartAdmin)
 admin.site.register(Customer, CustomerAdmin)
-admin.site.register(Order)
\ No newline at end of file
+admin.site.register(Order, OrderAdmin)
+admin.site.register(DeliverySlot, DeliverySlotAdmin)
\ No newline at end of file
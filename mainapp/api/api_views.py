@@ -1,110 +1,133 @@
-from collections import OrderedDict
-
 from rest_framework.response import Response
 from rest_framework.generics import ListAPIView, RetrieveAPIView, ListCreateAPIView, RetrieveUpdateAPIView, RetrieveDestroyAPIView
 from rest_framework.filters import SearchFilter
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.views import APIView
 from .serializers import CategorySerializer, UserSerializer, BeerProductSerializer, CustomerSerializer, PizzaProductSerializer, OrderSerializer, CartProductSerializer, CartSerializer
-from ..models import Category, BeerProduct, Customer, User, CartProduct, Cart, PizzaProduct, Order
-
-from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly, IsAdminUser, BasePermission, SAFE_METHODS
+from .serializers import BeerProductBulkSerializer, PizzaProductBulkSerializer, OrderBulkSerializer
+from .bulk import BulkWriteAPIView, OrderBulkWriteAPIView
+from .conditional import ConditionalGetMixin
+from .fast import FastListMixin
+from .response_cache import CachedResponseMixin
+from ..models import Category, BeerProduct, Customer, User, CartProduct, Cart, PizzaProduct, Order, LatestProducts
+
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAuthenticatedOrReadOnly, IsAdminUser, BasePermission, SAFE_METHODS
 from rest_framework.response import Response
 
+from datetime import timedelta
+
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from ..caching import get_cached
+from ..cart import get_cart_for_request, get_cart_summary
+from ..export import EXPORTS, EXPORT_OUTPUTS, stream_export
+from ..registry import product_registry
+from ..search import product_search, AUTOCOMPLETE_LIMIT
+from ..slots import get_available_slots
 from ..custom_logging import logger
 
+class EagerLoadingMixin:
+
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.select_related_fields:
+            queryset = queryset.select_related(*self.select_related_fields)
+        if self.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*self.prefetch_related_fields)
+        return queryset
+
+
 class ReadOnly(BasePermission):
     def has_permission(self, request, view):
         logger.info('Использование функции has_permission')
         return request.method in SAFE_METHODS
 
 
-class CategoryPagination(PageNumberPagination):
-
-    page_size = 1
-    page_size_query_param = 'page_size'
-    max_page_size = 10
-
-    def get_paginated_response(self, data):
-        logger.info('Использование PageNumberPagination')
-        return Response(OrderedDict([
-            ('objects_count', self.page.paginator.count),
-            ('next', self.get_next_link()),
-            ('previous', self.get_previous_link()),
-            ('items', data),
-        ]))
-
-class CategoryDetailAPIView(RetrieveAPIView, RetrieveUpdateAPIView, RetrieveDestroyAPIView):
+class CategoryDetailAPIView(ConditionalGetMixin, CachedResponseMixin, EagerLoadingMixin, RetrieveAPIView, RetrieveUpdateAPIView, RetrieveDestroyAPIView):
 
     permission_classes = [IsAuthenticated, IsAdminUser|ReadOnly]
 
+    catalog_scopes = ('category',)
     serializer_class = CategorySerializer
     queryset = Category.objects.all()
     lookup_field = 'id'
 
 
-class CategoryAPIView(ListCreateAPIView):
+class CategoryAPIView(ConditionalGetMixin, CachedResponseMixin, EagerLoadingMixin, FastListMixin, ListCreateAPIView):
 
     permission_classes = [IsAuthenticated, IsAdminUser|ReadOnly]
 
+    catalog_scopes = ('category',)
     serializer_class = CategorySerializer
-    pagination_class = CategoryPagination
     queryset = Category.objects.all()
 
 
-class BeerProductListAPIView(ListCreateAPIView):
+class BeerProductListAPIView(ConditionalGetMixin, CachedResponseMixin, EagerLoadingMixin, FastListMixin, ListCreateAPIView):
 
     permission_classes = [IsAuthenticated, IsAdminUser|ReadOnly]
 
+    catalog_scopes = ('beerproduct',)
     serializer_class = BeerProductSerializer
     queryset = BeerProduct.objects.all()
     filter_backends = [SearchFilter]
     search_fields = ['id', 'title']
 
 
-class BeerProductDetailAPIView(RetrieveAPIView, RetrieveUpdateAPIView, RetrieveDestroyAPIView):
+class BeerProductDetailAPIView(ConditionalGetMixin, CachedResponseMixin, EagerLoadingMixin, RetrieveAPIView, RetrieveUpdateAPIView, RetrieveDestroyAPIView):
     
     permission_classes = [IsAuthenticated, IsAdminUser|ReadOnly]
 
+    catalog_scopes = ('beerproduct',)
     serializer_class = BeerProductSerializer
     queryset = BeerProduct.objects.all()
     lookup_field = 'id' 
 
 
-class CustomersListAPIView(ListCreateAPIView):
+class CustomersListAPIView(EagerLoadingMixin, ListCreateAPIView):
 
     permission_classes = [IsAdminUser]
 
     serializer_class = CustomerSerializer
     queryset = Customer.objects.all()
+    select_related_fields = ('user',)
 
 
-class CustomerDetailAPIView(RetrieveAPIView, RetrieveUpdateAPIView, RetrieveDestroyAPIView):
+class CustomerDetailAPIView(EagerLoadingMixin, RetrieveAPIView, RetrieveUpdateAPIView, RetrieveDestroyAPIView):
 
     permission_classes = [IsAdminUser]
 
     serializer_class = CustomerSerializer
     queryset = Customer.objects.all()
+    select_related_fields = ('user',)
     lookup_field = 'user' 
 
 
-class PizzaProductDetailAPIView(RetrieveAPIView, RetrieveUpdateAPIView, RetrieveDestroyAPIView):
+class PizzaProductDetailAPIView(ConditionalGetMixin, CachedResponseMixin, EagerLoadingMixin, RetrieveAPIView, RetrieveUpdateAPIView, RetrieveDestroyAPIView):
 
     permission_classes = [IsAuthenticated, IsAdminUser|ReadOnly]
 
+    catalog_scopes = ('pizzaproduct',)
     serializer_class = PizzaProductSerializer
     queryset = PizzaProduct.objects.all()
     lookup_field = 'id'
 
 
-class PizzaProductAPIView(ListCreateAPIView):
+class PizzaProductAPIView(ConditionalGetMixin, CachedResponseMixin, EagerLoadingMixin, FastListMixin, ListCreateAPIView):
 
     permission_classes = [IsAuthenticated, IsAdminUser|ReadOnly]
 
+    catalog_scopes = ('pizzaproduct',)
     serializer_class = PizzaProductSerializer
     queryset = PizzaProduct.objects.all()
 
 
-class UserDetailAPIView(RetrieveAPIView, RetrieveUpdateAPIView, RetrieveDestroyAPIView):
+class UserDetailAPIView(EagerLoadingMixin, RetrieveAPIView, RetrieveUpdateAPIView, RetrieveDestroyAPIView):
 
     permission_classes = [IsAdminUser]
 
@@ -113,7 +136,7 @@ class UserDetailAPIView(RetrieveAPIView, RetrieveUpdateAPIView, RetrieveDestroyA
     lookup_field = 'id'
 
 
-class UserAPIView(ListCreateAPIView):
+class UserAPIView(EagerLoadingMixin, ListCreateAPIView):
 
     permission_classes = [IsAdminUser]
 
@@ -121,7 +144,7 @@ class UserAPIView(ListCreateAPIView):
     queryset = User.objects.all()
 
 
-class CartDetailAPIView(RetrieveAPIView, RetrieveUpdateAPIView, RetrieveDestroyAPIView):
+class CartDetailAPIView(EagerLoadingMixin, RetrieveAPIView, RetrieveUpdateAPIView, RetrieveDestroyAPIView):
 
     permission_classes = [IsAdminUser]
 
@@ -130,7 +153,7 @@ class CartDetailAPIView(RetrieveAPIView, RetrieveUpdateAPIView, RetrieveDestroyA
     lookup_field = 'id'
 
 
-class CartAPIView(ListCreateAPIView):
+class CartAPIView(EagerLoadingMixin, ListCreateAPIView):
 
     permission_classes = [IsAdminUser]
 
@@ -138,7 +161,7 @@ class CartAPIView(ListCreateAPIView):
     queryset = Cart.objects.all()
 
 
-class CartProductDetailAPIView(RetrieveAPIView, RetrieveUpdateAPIView, RetrieveDestroyAPIView):
+class CartProductDetailAPIView(EagerLoadingMixin, RetrieveAPIView, RetrieveUpdateAPIView, RetrieveDestroyAPIView):
 
     permission_classes = [IsAdminUser]
 
@@ -147,7 +170,7 @@ class CartProductDetailAPIView(RetrieveAPIView, RetrieveUpdateAPIView, RetrieveD
     lookup_field = 'id'
 
 
-class CartProductAPIView(ListCreateAPIView):
+class CartProductAPIView(EagerLoadingMixin, ListCreateAPIView):
 
     permission_classes = [IsAdminUser]
 
@@ -155,7 +178,7 @@ class CartProductAPIView(ListCreateAPIView):
     queryset = CartProduct.objects.all()
 
 
-class OrderDetailAPIView(RetrieveAPIView, RetrieveUpdateAPIView, RetrieveDestroyAPIView):
+class OrderDetailAPIView(EagerLoadingMixin, RetrieveAPIView, RetrieveUpdateAPIView, RetrieveDestroyAPIView):
 
     permission_classes = [IsAdminUser]
 
@@ -164,7 +187,7 @@ class OrderDetailAPIView(RetrieveAPIView, RetrieveUpdateAPIView, RetrieveDestroy
     lookup_field = 'id'
 
 
-class OrderAPIView(ListCreateAPIView):
+class OrderAPIView(EagerLoadingMixin, FastListMixin, ListCreateAPIView):
 
     permission_classes = [IsAdminUser]
 
@@ -172,4 +195,82 @@ class OrderAPIView(ListCreateAPIView):
     queryset = Order.objects.all()
 
 
+class ProductAutocompleteAPIView(APIView):
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    renderer_classes = [JSONRenderer]
+
+    def get(self, request):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', AUTOCOMPLETE_LIMIT)), AUTOCOMPLETE_LIMIT))
+        except ValueError:
+            limit = AUTOCOMPLETE_LIMIT
+        return Response(product_search.autocomplete(request.query_params.get('q', ''), limit))
+
+
+class BeerProductBulkAPIView(BulkWriteAPIView):
+
+    serializer_class = BeerProductBulkSerializer
+
+
+class PizzaProductBulkAPIView(BulkWriteAPIView):
+
+    serializer_class = PizzaProductBulkSerializer
+
+
+class OrderBulkAPIView(OrderBulkWriteAPIView):
+
+    serializer_class = OrderBulkSerializer
+
+
+class ExportAPIView(APIView):
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, name):
+        if name not in EXPORTS:
+            raise Http404
+        output = request.query_params.get('output', 'ndjson')
+        if output not in EXPORT_OUTPUTS:
+            raise ValidationError({'output': ['Допустимые форматы: {}'.format(', '.join(EXPORT_OUTPUTS))]})
+        response = StreamingHttpResponse(stream_export(name, output), content_type=EXPORT_OUTPUTS[output])
+        response['Content-Disposition'] = f'attachment; filename="{name}.{output}"'
+        return response
+
+
+def build_storefront_catalog():
+    products = LatestProducts.objects.get_products_for_main_page('pizzaproduct', 'beerproduct', with_respect_to='pizzaproduct')
+    return {
+        'categories': Category.objects.get_categories_for_left_sidebar(),
+        'products': [dict(product, price=str(product['price'])) for product in products],
+    }
+
+
+class StorefrontBootstrapAPIView(APIView):
+
+    permission_classes = [AllowAny]
+    renderer_classes = [JSONRenderer]
+
+    def get(self, request):
+        logger.info('Использование StorefrontBootstrapAPIView')
+        scopes = [Category._meta.model_name, *product_registry.get_ct_models()]
+        data = dict(get_cached('storefront_bootstrap', scopes, build_storefront_catalog))
+        cart_summary = get_cart_summary(get_cart_for_request(request))
+        data['cart'] = dict(cart_summary, final_price=str(cart_summary['final_price']))
+        return Response(data)
+
+
+class DeliverySlotsAPIView(APIView):
+
+    permission_classes = [AllowAny]
+    renderer_classes = [JSONRenderer]
 
+    def get(self, request):
+        try:
+            date_from = parse_date(request.query_params.get('from', '')) or timezone.localdate()
+            date_to = parse_date(request.query_params.get('to', '')) or date_from + timedelta(days=6)
+            slots = get_available_slots(date_from, date_to)
+        except ValueError as error:
+            raise ValidationError({'dates': [str(error)]})
+        return Response(slots)
@@ -0,0 +1,170 @@
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ..models import Customer
+from ..orders import create_order_lines
+from ..order_status import record_created_orders
+from ..custom_logging import logger
+
+
+class NDJSONParser(BaseParser):
+
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            return [json.loads(line) for line in stream.read().decode(encoding).splitlines() if line.strip()]
+        except ValueError as exc:
+            raise ParseError('NDJSON parse error - {}'.format(exc))
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+
+    def preload(self, values):
+        model = self.get_queryset().model
+        pks = set()
+        for value in values:
+            try:
+                pks.add(model._meta.pk.to_python(value))
+            except DjangoValidationError:
+                continue
+        objects = {str(pk): obj for pk, obj in self.get_queryset().in_bulk(pks).items()}
+        preloaded = self.context['related_objects'].setdefault(model, {})
+        for value in values:
+            preloaded[str(value)] = objects.get(str(value))
+
+    def to_internal_value(self, data):
+        preloaded = self.context.get('related_objects', {}).get(self.get_queryset().model, {})
+        if str(data) not in preloaded:
+            return super().to_internal_value(data)
+        if preloaded[str(data)] is None:
+            self.fail('does_not_exist', pk_value=data)
+        return preloaded[str(data)]
+
+
+class BulkWriteAPIView(APIView):
+
+    permission_classes = [IsAdminUser]
+    parser_classes = [JSONParser, NDJSONParser]
+    serializer_class = None
+    chunk_size = getattr(settings, 'API_BULK_CHUNK_SIZE', 500)
+
+    def get_model(self):
+        return self.serializer_class.Meta.model
+
+    def post(self, request):
+        logger.info(f'Массовая запись {self.get_model()._meta.model_name} через api')
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError('Ожидается массив объектов')
+        results = [None] * len(items)
+        for start in range(0, len(items), self.chunk_size):
+            self.write_chunk(list(enumerate(items[start:start + self.chunk_size], start)), results)
+        return Response({'results': results})
+
+    def preload_related(self, items, context):
+        serializer = self.serializer_class(context=context)
+        for name, field in serializer.fields.items():
+            if isinstance(field, BulkPrimaryKeyRelatedField):
+                field.preload({item[name] for item in items if isinstance(item.get(name), (int, str))})
+
+    def get_existing(self, items):
+        ids = set()
+        for item in items:
+            try:
+                ids.add(int(item['id']))
+            except (KeyError, TypeError, ValueError):
+                continue
+        return self.get_model().objects.in_bulk(ids)
+
+    def write_chunk(self, chunk, results):
+        model = self.get_model()
+        items = [item for _, item in chunk if isinstance(item, dict)]
+        context = {'request': self.request, 'related_objects': {}}
+        self.preload_related(items, context)
+        existing = self.get_existing(items)
+        created, updated, fields = [], [], set()
+        for index, item in chunk:
+            if not isinstance(item, dict):
+                results[index] = self.get_error(index, {'non_field_errors': ['Ожидается объект']})
+                continue
+            instance = None
+            if item.get('id') is not None:
+                try:
+                    instance = existing[int(item['id'])]
+                except (KeyError, TypeError, ValueError):
+                    results[index] = self.get_error(index, {'id': ['Объект не найден']})
+                    continue
+            serializer = self.serializer_class(instance, data=item, partial=instance is not None, context=context)
+            if not serializer.is_valid():
+                results[index] = self.get_error(index, serializer.errors)
+                continue
+            if instance is None:
+                created.append((index, model(**serializer.validated_data)))
+                continue
+            for attr, value in serializer.validated_data.items():
+                setattr(instance, attr, value)
+            fields.update(serializer.validated_data)
+            updated.append((index, instance))
+        try:
+            self.save_objects([obj for _, obj in created], [obj for _, obj in updated], fields)
+        except IntegrityError:
+            logger.warning('Ошибка целостности при массовой записи, запись по одному объекту')
+            for index, obj in created:
+                obj.pk = None
+                obj._state.adding = True
+                self.save_one(index, obj, results, [obj], [], fields)
+            for index, obj in updated:
+                self.save_one(index, obj, results, [], [obj], fields)
+            return
+        for index, obj in created:
+            results[index] = {'index': index, 'status': 'created', 'id': obj.pk}
+        for index, obj in updated:
+            results[index] = {'index': index, 'status': 'updated', 'id': obj.pk}
+
+    def save_one(self, index, obj, results, created, updated, fields):
+        try:
+            self.save_objects(created, updated, fields)
+        except IntegrityError as exc:
+            results[index] = self.get_error(index, {'non_field_errors': [str(exc).splitlines()[0]]})
+            return
+        results[index] = {'index': index, 'status': 'created' if created else 'updated', 'id': obj.pk}
+
+    @staticmethod
+    def get_error(index, errors):
+        return {'index': index, 'status': 'error', 'errors': errors}
+
+    def save_objects(self, created, updated, fields):
+        model = self.get_model()
+        auto_now_fields = [field for field in model._meta.concrete_fields if getattr(field, 'auto_now', False)]
+        for obj in updated:
+            for field in auto_now_fields:
+                field.pre_save(obj, False)
+        with transaction.atomic():
+            model.objects.bulk_create(created)
+            if updated:
+                model.objects.bulk_update(updated, list(fields) + [field.name for field in auto_now_fields])
+            self.after_save(created, updated)
+
+    def after_save(self, created, updated):
+        pass
+
+
+class OrderBulkWriteAPIView(BulkWriteAPIView):
+
+    def after_save(self, created, updated):
+        create_order_lines(created)
+        record_created_orders(created)
+        Customer.objects.apply_order_totals_deltas(
+            [delta for order in created for delta in order.get_customer_totals_deltas(True)]
+        )
@@ -0,0 +1,41 @@
+import hashlib
+import time
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from ..caching import get_versions, get_last_changed
+from ..custom_logging import logger
+
+
+class ConditionalGetMixin:
+
+    catalog_scopes = ()
+
+    def get_etag(self, request, versions):
+        versions = ':'.join(str(version) for version in versions)
+        key = '{}:{}:{}'.format(request.get_full_path(), request.accepted_renderer.format, versions)
+        return quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+    def get_last_modified(self, request):
+        return get_last_changed(*self.catalog_scopes)
+
+    def get(self, request, *args, **kwargs):
+        versions = get_versions(*self.catalog_scopes)
+        etag = self.get_etag(request, versions)
+        last_modified = self.get_last_modified(request)
+        if last_modified >= int(time.time()):
+            last_modified = None
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        else:
+            logger.debug('Каталог не изменился, ответ 304')
+        if getattr(response, 'catalog_versions', versions) != versions:
+            logger.debug('Отдан устаревший ответ каталога без валидаторов')
+            return response
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
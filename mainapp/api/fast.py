@@ -0,0 +1,91 @@
+from django.core.files.storage import FileSystemStorage
+from django.http import HttpResponse
+from django.utils.encoding import filepath_to_uri
+from rest_framework import serializers
+from rest_framework.fields import FileField
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+
+from ..custom_logging import logger
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def get_value_converters(serializer):
+    model = serializer.Meta.model
+    request = serializer.context.get('request')
+    converters = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.BaseSerializer) or '.' in field.source or field.source == '*':
+            return None
+        if isinstance(field, PrimaryKeyRelatedField):
+            converters.append((name, field.source, lambda value: value))
+        elif isinstance(field, FileField):
+            converters.append((name, field.source, get_file_url_converter(model, field.source, request)))
+        elif isinstance(field, serializers.ModelField) or not hasattr(model, field.source):
+            return None
+        else:
+            converters.append((name, field.source, get_field_converter(field)))
+    return converters
+
+
+def get_field_converter(field):
+    def convert(value):
+        return None if value is None else field.to_representation(value)
+    return convert
+
+
+def get_file_url_converter(model, source, request):
+    storage = model._meta.get_field(source).storage
+    if isinstance(storage, FileSystemStorage):
+        base_url = storage.base_url if request is None else request.build_absolute_uri(storage.base_url)
+
+        def convert(value):
+            return base_url + filepath_to_uri(value).lstrip('/') if value else None
+        return convert
+
+    def convert(value):
+        if not value:
+            return None
+        url = storage.url(value)
+        return request.build_absolute_uri(url) if request is not None else url
+    return convert
+
+
+def serialize_values(queryset, converters):
+    return [
+        {name: convert(row[source]) for name, source, convert in converters}
+        for row in queryset
+    ]
+
+
+def get_values_queryset(queryset, converters):
+    return queryset.values('pk', *{source for _, source, _ in converters})
+
+
+def render_json(data):
+    if orjson is None:
+        return Response(data)
+    return HttpResponse(orjson.dumps(data), content_type='application/json')
+
+
+class FastListMixin:
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        converters = get_value_converters(self.get_serializer())
+        if converters is None:
+            return super().list(request, *args, **kwargs)
+        logger.debug('Быстрая сериализация списка через values()')
+        queryset = get_values_queryset(self.filter_queryset(self.get_queryset()), converters)
+        page = self.paginate_queryset(queryset)
+        data = serialize_values(page if page is not None else queryset, converters)
+        if page is not None:
+            data = self.get_paginated_response(data).data
+        return render_json(data)
@@ -0,0 +1,22 @@
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+from ..custom_logging import logger
+
+
+class KeysetPagination(CursorPagination):
+
+    ordering = '-pk'
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 100)
+
+    def get_paginated_response(self, data):
+        logger.info('Использование KeysetPagination')
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('items', data),
+        ]))
@@ -0,0 +1,56 @@
+import hashlib
+
+from django.http import HttpResponse
+
+from ..caching import get_cached, get_versions
+
+
+CACHED_HEADERS = ('Vary', 'Allow')
+
+
+class CachedResponseMixin:
+
+    catalog_scopes = ()
+    response_cache_timeout = 60 * 60
+
+    def get_response_cache_audience(self, request):
+        user = request.user
+        if not user.is_authenticated:
+            return 'anonymous'
+        return 'staff' if user.is_staff else 'authenticated'
+
+    def get_response_cache_name(self, request):
+        query = sorted(request.query_params.lists())
+        audience = self.get_response_cache_audience(request)
+        key = '{}|{}|{}|{}'.format(request.path, query, audience, request.accepted_renderer.format)
+        return 'api_response:{}'.format(hashlib.md5(key.encode()).hexdigest())
+
+    def get(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return super().get(request, *args, **kwargs)
+        uncached_response = None
+
+        def build():
+            nonlocal uncached_response
+            versions = get_versions(*self.catalog_scopes)
+            response = self.finalize_response(request, super(CachedResponseMixin, self).get(request, *args, **kwargs))
+            if hasattr(response, 'render'):
+                response.render()
+            if response.status_code != 200:
+                uncached_response = response
+                return None
+            return {
+                'content': response.content,
+                'content_type': response['Content-Type'],
+                'headers': {name: response[name] for name in CACHED_HEADERS if response.has_header(name)},
+                'versions': versions,
+            }
+
+        cached = get_cached(self.get_response_cache_name(request), self.catalog_scopes, build, self.response_cache_timeout)
+        if uncached_response is not None:
+            return uncached_response
+        response = HttpResponse(cached['content'], content_type=cached['content_type'])
+        for name, value in cached['headers'].items():
+            response[name] = value
+        response.catalog_versions = cached['versions']
+        return response
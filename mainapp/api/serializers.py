@@ -1,9 +1,32 @@
+import os
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 
-from ..models import Category, BeerProduct, Customer, User, CartProduct, Cart, PizzaProduct, Order
+from ..models import Category, BeerProduct, Customer, User, CartProduct, Cart, PizzaProduct, Order, TransitionError, check_transition
+from ..orders import place_order
+from ..slots import SlotUnavailable
+from .bulk import BulkPrimaryKeyRelatedField
 from ..custom_logging import logger
 
-class CategorySerializer(serializers.ModelSerializer):
+
+class SparseFieldsetMixin:
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return
+        fields = request.query_params.get('fields')
+        if fields:
+            requested = set(fields.split(','))
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+
+class CategorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
 
     name = serializers.CharField(required=True)
     slug = serializers.SlugField()
@@ -42,7 +65,7 @@ class BaseProductSerializer:
     
 
 
-class BeerProductSerializer(BaseProductSerializer, serializers.ModelSerializer):
+class BeerProductSerializer(SparseFieldsetMixin, BaseProductSerializer, serializers.ModelSerializer):
 
     colour = serializers.CharField(required=True)
     alcohol_strength = serializers.CharField(required=True) 
@@ -57,7 +80,7 @@ class BeerProductSerializer(BaseProductSerializer, serializers.ModelSerializer):
         
 
 
-class PizzaProductSerializer(BaseProductSerializer, serializers.ModelSerializer):
+class PizzaProductSerializer(SparseFieldsetMixin, BaseProductSerializer, serializers.ModelSerializer):
 
     size = serializers.CharField(required=True)
     board = serializers.CharField(required=True) 
@@ -70,12 +93,32 @@ class PizzaProductSerializer(BaseProductSerializer, serializers.ModelSerializer)
 
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
 
 
     class Meta:
         model = Order
         fields = '__all__'
+        read_only_fields = ['slot']
+
+    def validate_status(self, value):
+        if self.instance is not None and value != self.instance.status:
+            try:
+                check_transition(self.instance.status, value)
+            except TransitionError as exc:
+                raise serializers.ValidationError(str(exc))
+        return value
+
+    def create(self, validated_data):
+        cart = validated_data.pop('cart', None)
+        if cart is None:
+            return super().create(validated_data)
+        logger.info(f'Создание заказа для корзины {cart.id} через api')
+        validated_data.setdefault('order_date', timezone.localdate())
+        try:
+            return place_order(Order(**validated_data), cart)
+        except SlotUnavailable as exc:
+            raise serializers.ValidationError({'order_date': [str(exc)]})
 
 
 class CustomerSerializer(serializers.ModelSerializer):
@@ -112,4 +155,50 @@ class CartProductSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = CartProduct
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+
+class BulkProductSerializerMixin(serializers.Serializer):
+
+    category = BulkPrimaryKeyRelatedField(queryset=Category.objects.all())
+    slug = serializers.SlugField(required=True)
+    image = serializers.CharField(max_length=100)
+
+    def validate_image(self, value):
+        storage = self.Meta.model._meta.get_field('image').storage
+        if os.path.isabs(value) or '..' in value.replace('\\', '/').split('/'):
+            raise serializers.ValidationError('Недопустимый путь к изображению')
+        try:
+            exists = storage.exists(value)
+        except SuspiciousFileOperation:
+            raise serializers.ValidationError('Недопустимый путь к изображению')
+        if not exists:
+            raise serializers.ValidationError('Изображение не найдено в хранилище')
+        return value
+
+
+class BeerProductBulkSerializer(BulkProductSerializerMixin, BeerProductSerializer):
+    pass
+
+
+class PizzaProductBulkSerializer(BulkProductSerializerMixin, PizzaProductSerializer):
+    pass
+
+
+class OrderBulkSerializer(OrderSerializer):
+
+    customer = BulkPrimaryKeyRelatedField(queryset=Customer.objects.all())
+    cart = BulkPrimaryKeyRelatedField(queryset=Cart.objects.all(), required=False, allow_null=True)
+
+    class Meta(OrderSerializer.Meta):
+        read_only_fields = ['slot', 'final_price']
+
+    def validate(self, attrs):
+        if attrs.get('cart') is not None:
+            attrs['final_price'] = attrs['cart'].final_price
+        return attrs
+
+    def validate_status(self, value):
+        if self.instance is not None and value != self.instance.status:
+            raise serializers.ValidationError('Статус заказа меняется через /api/orders/<id>/')
+        return value
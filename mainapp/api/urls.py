@@ -16,7 +16,14 @@ from .api_views import (
     CartAPIView,
     CartDetailAPIView,
     OrderAPIView,
-    OrderDetailAPIView
+    OrderDetailAPIView,
+    ProductAutocompleteAPIView,
+    BeerProductBulkAPIView,
+    PizzaProductBulkAPIView,
+    OrderBulkAPIView,
+    ExportAPIView,
+    StorefrontBootstrapAPIView,
+    DeliverySlotsAPIView
 )
 
 
@@ -26,10 +33,13 @@ urlpatterns = [
     path('customers/', CustomersListAPIView.as_view(), name='customers_list'),
     path('customers/<str:user>/', CustomerDetailAPIView.as_view(), name='customer_detail'),
     path('beer/', BeerProductListAPIView.as_view(), name='beer_list'),
+    path('beer/bulk/', BeerProductBulkAPIView.as_view(), name='beer_bulk'),
     path('beer/<str:id>/', BeerProductDetailAPIView.as_view(), name='beer_detail'),
     path('pizza/', PizzaProductAPIView.as_view(), name='pizza_list'),
+    path('pizza/bulk/', PizzaProductBulkAPIView.as_view(), name='pizza_bulk'),
     path('pizza/<str:id>/', PizzaProductDetailAPIView.as_view(), name='pizza_detail'),
     path('orders/', OrderAPIView.as_view(), name='orders_list'),
+    path('orders/bulk/', OrderBulkAPIView.as_view(), name='orders_bulk'),
     path('orders/<str:id>/', OrderDetailAPIView.as_view(), name='order_detail'),
     path('carts/', CartAPIView.as_view(), name='carts_list'),
     path('carts/<str:id>/', CartDetailAPIView.as_view(), name='cart_detail'),
@@ -37,4 +47,8 @@ urlpatterns = [
     path('cartproducts/<str:id>/', CartProductDetailAPIView.as_view(), name='cartproduct_detail'),
     path('users/', UserAPIView.as_view(), name='users_list'),
     path('users/<str:id>/', UserDetailAPIView.as_view(), name='user_detail'),
+    path('export/<str:name>/', ExportAPIView.as_view(), name='export'),
+    path('bootstrap/', StorefrontBootstrapAPIView.as_view(), name='storefront_bootstrap'),
+    path('autocomplete/', ProductAutocompleteAPIView.as_view(), name='product_autocomplete'),
+    path('slots/', DeliverySlotsAPIView.as_view(), name='delivery_slots'),
 ]
\ No newline at end of file
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class MainappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mainapp'
+
+    def ready(self):
+        from .caching import check_shared_cache
+        check_shared_cache()
+        from .events import check_events_spool
+        check_events_spool()
+        from .registry import product_registry
+        product_registry.autodiscover()
+        from . import signals
@@ -0,0 +1,94 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+
+from .custom_logging import logger
+
+
+VERSION_KEY = 'catalog:version:{}'
+CHANGED_KEY = 'catalog:changed:{}'
+CACHE_TIMEOUT = 60 * 60
+STALE_TIMEOUT = 24 * 60 * 60
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 5
+LOCK_POLL_INTERVAL = 0.05
+
+
+def check_shared_cache():
+    if settings.WEB_CONCURRENCY > 1 and isinstance(caches['default'], LocMemCache):
+        raise ImproperlyConfigured(
+            'Кэш в памяти процесса не подходит для нескольких воркеров: версии каталога и блокировки '
+            'не будут общими. Задайте CACHE_LOCATION (и при необходимости CACHE_BACKEND)'
+        )
+
+
+def get_versions(*scopes):
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, int(time.time() * 1000), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(*scopes):
+    logger.debug('Инвалидация кэша каталога для {}'.format(', '.join(scopes)))
+    versions = []
+    cache.set_many({CHANGED_KEY.format(scope): int(time.time()) for scope in scopes}, None)
+    for scope in scopes:
+        key = VERSION_KEY.format(scope)
+        try:
+            versions.append(cache.incr(key))
+        except ValueError:
+            cache.add(key, int(time.time() * 1000), None)
+            versions.append(cache.get(key))
+    return versions
+
+
+def get_last_changed(*scopes):
+    keys = [CHANGED_KEY.format(scope) for scope in scopes]
+    changed = cache.get_many(keys)
+    for key in keys:
+        if key not in changed:
+            cache.add(key, int(time.time()), None)
+            changed[key] = cache.get(key)
+    return max(changed.values())
+
+
+def wait_for_value(key):
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+    return None
+
+
+def get_cached(name, scopes, builder, timeout=CACHE_TIMEOUT):
+    key = '{}:{}'.format(name, ':'.join(str(version) for version in get_versions(*scopes)))
+    value = cache.get(key)
+    if value is not None:
+        return value
+    lock_key = '{}:lock'.format(key)
+    stale_key = '{}:stale'.format(name)
+    if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        value = cache.get(stale_key)
+        if value is None:
+            logger.debug(f'Ожидание пересборки кэша {name}')
+            value = wait_for_value(key)
+        if value is not None:
+            return value
+    logger.debug(f'Пересборка кэша {name}')
+    try:
+        value = builder()
+        if value is not None:
+            cache.set(key, value, timeout)
+            cache.set(stale_key, value, STALE_TIMEOUT)
+    finally:
+        cache.delete(lock_key)
+    return value
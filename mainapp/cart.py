@@ -0,0 +1,208 @@
+from decimal import Decimal
+
+from django.contrib.sessions.backends.base import SessionBase
+from django.db import IntegrityError, transaction
+
+from .models import Cart, CartProduct, Customer
+from .registry import product_registry
+from .utils import update_cart_totals, prefetch_content_objects
+from .custom_logging import logger
+
+
+CART_SESSION_KEY = 'cart_id'
+GUEST_CART_SESSION_KEY = 'guest_cart'
+CART_LINE_CONSTRAINT = 'unique_cart_product'
+
+
+def get_session(request):
+    session = getattr(request, 'session', None)
+    if isinstance(session, SessionBase):
+        return session
+    return None
+
+
+class GuestCartItem:
+
+    def __init__(self, content_object, qty):
+        self.content_object = content_object
+        self.qty = qty
+        self.final_price = qty * content_object.price
+
+
+class GuestCart:
+
+    id = None
+    owner = None
+    for_anonymous_user = True
+
+    def __init__(self, session=None):
+        self.session = session if session is not None else {}
+        self.lines = dict(self.session.get(GUEST_CART_SESSION_KEY) or {})
+
+    def __str__(self):
+        return 'guest'
+
+    @staticmethod
+    def get_line_key(product):
+        return '{}:{}'.format(product._meta.model_name, product.id)
+
+    @property
+    def total_products(self):
+        return len(self.lines)
+
+    @property
+    def final_price(self):
+        return sum((Decimal(line['price']) * line['qty'] for line in self.lines.values()), Decimal(0))
+
+    def save(self):
+        if self.lines:
+            self.session[GUEST_CART_SESSION_KEY] = self.lines
+        else:
+            self.session.pop(GUEST_CART_SESSION_KEY, None)
+
+    def add_product(self, product):
+        logger.debug('Добавление товара в гостевую корзину')
+        key = self.get_line_key(product)
+        if key not in self.lines:
+            self.lines[key] = {'qty': 1, 'price': str(product.price)}
+            self.save()
+
+    def remove_product(self, product):
+        logger.debug('Удаление товара из гостевой корзины')
+        if self.lines.pop(self.get_line_key(product), None) is not None:
+            self.save()
+
+    def change_qty(self, product, qty):
+        logger.debug('Изменение кол-ва товара в гостевой корзине')
+        line = self.lines.get(self.get_line_key(product))
+        if line is not None:
+            line['qty'] = qty
+            line['price'] = str(product.price)
+            self.save()
+
+    def clear(self):
+        self.lines = {}
+        self.save()
+
+    def get_items(self):
+        ids_by_model = {}
+        for key in self.lines:
+            ct_model, object_id = key.split(':')
+            ids_by_model.setdefault(ct_model, []).append(int(object_id))
+        products = {}
+        for ct_model, ids in ids_by_model.items():
+            for object_id, product in product_registry.get_model(ct_model).objects.in_bulk(ids).items():
+                products['{}:{}'.format(ct_model, object_id)] = product
+        return [
+            GuestCartItem(products[key], line['qty'])
+            for key, line in self.lines.items() if key in products
+        ]
+
+
+def get_cart_summary(cart):
+    return dict(id=cart.id, total_products=cart.total_products, final_price=cart.final_price)
+
+
+def get_open_cart(user, session=None):
+    cart_id = session.get(CART_SESSION_KEY) if session is not None else None
+    carts = Cart.objects.select_related('owner').filter(owner_id=user.pk, in_order=False)
+    cart = carts.filter(id=cart_id).first() if cart_id else None
+    if cart is None:
+        cart = carts.first()
+    if cart is None:
+        customer, _ = Customer.objects.get_or_create(user=user)
+        cart = Cart.objects.create(owner=customer)
+    if session is not None and cart_id != cart.id:
+        session[CART_SESSION_KEY] = cart.id
+    return cart
+
+
+def get_cart_for_request(request):
+    logger.debug('Получение корзины для запроса')
+    session = get_session(request)
+    if not request.user.is_authenticated:
+        return GuestCart(session)
+    return get_open_cart(request.user, session)
+
+
+def get_cart_items(cart):
+    if isinstance(cart, GuestCart):
+        return cart.get_items()
+    return prefetch_content_objects(cart.related_products.all())
+
+
+def get_cart_lines(cart, product):
+    return CartProduct.objects.filter(
+        cart=cart, content_type=product_registry.get_content_type(product.__class__), object_id=product.id
+    )
+
+
+def insert_cart_product(cart, product, qty=1):
+    cart_product = CartProduct.objects.create(user=cart.owner, cart=cart, content_object=product, qty=qty)
+    return cart_product
+
+
+def is_duplicate_cart_line(error):
+    constraint_name = getattr(getattr(error.__cause__, 'diag', None), 'constraint_name', None)
+    return constraint_name == CART_LINE_CONSTRAINT or CART_LINE_CONSTRAINT in str(error)
+
+
+def add_product(cart, product):
+    if isinstance(cart, GuestCart):
+        return cart.add_product(product)
+    try:
+        with transaction.atomic():
+            cart_product = insert_cart_product(cart, product)
+            update_cart_totals(cart, 1, cart_product.final_price)
+    except IntegrityError as error:
+        if not is_duplicate_cart_line(error):
+            raise
+        logger.debug('Товар уже находится в корзине')
+
+
+def remove_product(cart, product):
+    if isinstance(cart, GuestCart):
+        return cart.remove_product(product)
+    lines = get_cart_lines(cart, product)
+    with transaction.atomic():
+        final_price = lines.select_for_update().values_list('final_price', flat=True).first()
+        if final_price is None:
+            return
+        lines.delete()
+        update_cart_totals(cart, -1, -final_price)
+
+
+def change_qty(cart, product, qty):
+    if isinstance(cart, GuestCart):
+        return cart.change_qty(product, qty)
+    lines = get_cart_lines(cart, product)
+    final_price = qty * product.price
+    with transaction.atomic():
+        old_final_price = lines.select_for_update().values_list('final_price', flat=True).first()
+        if old_final_price is None:
+            return
+        lines.update(qty=qty, final_price=final_price)
+        update_cart_totals(cart, 0, final_price - old_final_price)
+
+
+def merge_guest_cart(request, user):
+    session = get_session(request)
+    if session is None or not session.get(GUEST_CART_SESSION_KEY):
+        return
+    logger.info(f'Перенос гостевой корзины в базу для пользователя {user}')
+    guest_cart = GuestCart(session)
+    cart = get_open_cart(user, session)
+    products_delta, price_delta = 0, 0
+    with transaction.atomic():
+        for item in guest_cart.get_items():
+            try:
+                with transaction.atomic():
+                    cart_product = insert_cart_product(cart, item.content_object, item.qty)
+            except IntegrityError as error:
+                if not is_duplicate_cart_line(error):
+                    raise
+                continue
+            products_delta += 1
+            price_delta += cart_product.final_price
+        update_cart_totals(cart, products_delta, price_delta)
+    guest_cart.clear()
@@ -0,0 +1,2 @@
+def cart_summary(request):
+    return {'cart_summary': getattr(request, 'cart_summary', None)}
@@ -0,0 +1,189 @@
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+from .custom_logging import logger
+
+
+SPOOL_POLL_INTERVAL = 0.1
+SUBSCRIBER_QUEUE_SIZE = 1000
+HEARTBEAT_INTERVAL = 15
+STREAM_MAX_SECONDS = getattr(settings, 'KITCHEN_STREAM_MAX_SECONDS', 5 * 60)
+SPOOL_MAX_BYTES = getattr(settings, 'ORDER_EVENTS_SPOOL_MAX_BYTES', 10 * 1024 * 1024)
+
+
+class Subscription:
+
+    def __init__(self, hub):
+        self.hub = hub
+        self.queue = queue.Queue(SUBSCRIBER_QUEUE_SIZE)
+
+    def get(self, timeout=None):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class EventHub:
+
+    def __init__(self, spool_path=None, spool_max_bytes=SPOOL_MAX_BYTES):
+        self.spool_path = spool_path
+        self.spool_max_bytes = spool_max_bytes
+        self.origin = uuid.uuid4().hex
+        self.lock = threading.Lock()
+        self.subscriptions = set()
+        self.tail_thread = None
+
+    def subscribe(self):
+        subscription = Subscription(self)
+        with self.lock:
+            self.subscriptions.add(subscription)
+            if self.spool_path and self.tail_thread is None:
+                position = os.path.getsize(self.spool_path) if os.path.exists(self.spool_path) else 0
+                self.tail_thread = threading.Thread(target=self.tail_spool, args=(position,), daemon=True)
+                self.tail_thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    def publish(self, event):
+        logger.debug(f'Публикация события {event.get("type")}')
+        self.deliver(event)
+        if self.spool_path:
+            line = json.dumps({'origin': self.origin, 'event': event}, ensure_ascii=False)
+            with open(self.spool_path, 'a', encoding='utf-8') as spool:
+                spool.write(line + '\n')
+                size = spool.tell()
+            if size > self.spool_max_bytes:
+                self.rotate_spool()
+
+    def rotate_spool(self):
+        logger.info('Ротация файла событий заказов')
+        try:
+            os.replace(self.spool_path, self.spool_path + '.1')
+        except FileNotFoundError:
+            pass
+
+    def deliver(self, event):
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.queue.put_nowait(event)
+            except queue.Full:
+                logger.warning('Очередь подписчика переполнена, событие пропущено')
+
+    def deliver_lines(self, buffer):
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('origin') != self.origin:
+                self.deliver(record['event'])
+        return buffer
+
+    def is_rotated(self, spool):
+        try:
+            return os.stat(self.spool_path).st_ino != os.fstat(spool.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def tail_spool(self, position):
+        spool, buffer = None, b''
+        while True:
+            with self.lock:
+                if not self.subscriptions:
+                    self.tail_thread = None
+                    break
+            if spool is None and os.path.exists(self.spool_path):
+                spool = open(self.spool_path, 'rb')
+                spool.seek(position)
+                position = 0
+            if spool is not None:
+                if os.fstat(spool.fileno()).st_size < spool.tell():
+                    spool.seek(0)
+                    buffer = b''
+                buffer = self.deliver_lines(buffer + spool.read())
+                if self.is_rotated(spool):
+                    self.deliver_lines(buffer + spool.read())
+                    spool.close()
+                    spool, buffer = None, b''
+            time.sleep(SPOOL_POLL_INTERVAL)
+        if spool is not None:
+            spool.close()
+
+
+order_events = EventHub(getattr(settings, 'ORDER_EVENTS_SPOOL', None))
+
+
+def check_events_spool():
+    if settings.WEB_CONCURRENCY > 1 and not order_events.spool_path:
+        raise ImproperlyConfigured(
+            'События заказов без общего файла видны только в своём воркере. '
+            'Задайте ORDER_EVENTS_SPOOL для нескольких воркеров'
+        )
+
+
+def get_order_event(order, event_type):
+    return {
+        'type': event_type,
+        'order_id': order.id,
+        'status': order.status,
+        'status_display': order.get_status_display(),
+        'first_name': order.first_name,
+        'last_name': order.last_name,
+        'buying_type': order.get_buying_type_display(),
+        'final_price': str(order.final_price),
+        'created_at': order.created_at.isoformat() if order.created_at else None,
+    }
+
+
+def publish_order_event(order, event_type):
+    event = get_order_event(order, event_type)
+    transaction.on_commit(lambda: order_events.publish(event))
+
+
+class ServerSentEventStream:
+
+    def __init__(self, subscription, heartbeat_interval=HEARTBEAT_INTERVAL, max_seconds=STREAM_MAX_SECONDS):
+        self.subscription = subscription
+        self.heartbeat_interval = heartbeat_interval
+        self.max_seconds = max_seconds
+
+    def __iter__(self):
+        yield 'retry: 1000\n\n'
+        deadline = time.monotonic() + self.max_seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            event = self.subscription.get(timeout=min(self.heartbeat_interval, remaining))
+            if event is None:
+                yield ': keepalive\n\n'
+            else:
+                yield f'event: order\ndata: {json.dumps(event, ensure_ascii=False)}\n\n'
+        self.close()
+
+    def close(self):
+        self.subscription.close()
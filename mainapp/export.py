@@ -0,0 +1,94 @@
+import csv
+import json
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Order, OrderLine, Cart, CartProduct
+from .registry import product_registry
+from .custom_logging import logger
+
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_OUTPUTS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+ORDER_FIELDS = [
+    'id', 'customer_id', 'cart_id', 'first_name', 'last_name', 'phone', 'address',
+    'status', 'buying_type', 'comment', 'created_at', 'order_date', 'final_price'
+]
+ORDER_LINE_FIELDS = ['id', 'order_id', 'product_type', 'product_id', 'title', 'unit_price', 'qty', 'final_price']
+CART_FIELDS = ['id', 'owner_id', 'total_products', 'final_price', 'in_order', 'for_anonymous_user']
+LINE_FIELDS = ['id', 'cart_id', 'user_id', 'content_type_id', 'object_id', 'qty', 'final_price']
+LINE_PRODUCT_FIELDS = ['product_type', 'product_title', 'product_slug']
+
+
+def iter_chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_rows(queryset, fields, chunk_size):
+    return queryset.order_by('pk').values(*fields).iterator(chunk_size=chunk_size)
+
+
+def iter_orders(chunk_size=EXPORT_CHUNK_SIZE):
+    return iter_rows(Order.objects.all(), ORDER_FIELDS, chunk_size)
+
+
+def iter_order_lines(chunk_size=EXPORT_CHUNK_SIZE):
+    return iter_rows(OrderLine.objects.all(), ORDER_LINE_FIELDS, chunk_size)
+
+
+def iter_carts(chunk_size=EXPORT_CHUNK_SIZE):
+    return iter_rows(Cart.objects.all(), CART_FIELDS, chunk_size)
+
+
+def iter_lines(chunk_size=EXPORT_CHUNK_SIZE):
+    for chunk in iter_chunks(iter_rows(CartProduct.objects.all(), LINE_FIELDS, chunk_size), chunk_size):
+        ids_by_content_type = {}
+        for line in chunk:
+            ids_by_content_type.setdefault(line['content_type_id'], set()).add(line['object_id'])
+        products = {}
+        for content_type_id, ids in ids_by_content_type.items():
+            model = product_registry.get_model_for_content_type_id(content_type_id)
+            for product in model._base_manager.filter(id__in=ids).values('id', 'title', 'slug'):
+                products[content_type_id, product['id']] = dict(
+                    product_type=model._meta.model_name, product_title=product['title'], product_slug=product['slug']
+                )
+        for line in chunk:
+            line.update(products.get((line['content_type_id'], line['object_id']), dict.fromkeys(LINE_PRODUCT_FIELDS)))
+            yield line
+
+
+EXPORTS = {
+    'orders': (iter_orders, ORDER_FIELDS),
+    'order_lines': (iter_order_lines, ORDER_LINE_FIELDS),
+    'carts': (iter_carts, CART_FIELDS),
+    'lines': (iter_lines, LINE_FIELDS + LINE_PRODUCT_FIELDS),
+}
+
+
+class EchoBuffer:
+
+    def write(self, value):
+        return value
+
+
+def stream_export(name, output='ndjson', chunk_size=EXPORT_CHUNK_SIZE):
+    logger.info(f'Выгрузка {name} в формате {output}')
+    rows, fields = EXPORTS[name]
+    if output == 'csv':
+        writer = csv.writer(EchoBuffer())
+        yield writer.writerow(fields)
+        for row in rows(chunk_size):
+            yield writer.writerow([row[field] for field in fields])
+    else:
+        for row in rows(chunk_size):
+            yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
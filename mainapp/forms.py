@@ -1,6 +1,8 @@
 from django import forms
 from django.contrib.auth.models import User
+from django.utils.dateparse import parse_time
 from .models import Order, PizzaProduct
+from .slots import get_slot_schedule
 from .custom_logging import logger
 
 class OrderForm(forms.ModelForm):
@@ -8,8 +10,13 @@ class OrderForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['order_date'].label = 'Дата получения заказа'
+        self.fields['slot_start'].choices = [('', 'Как можно скорее')] + [
+            (start_time.strftime('%H:%M'), '{:%H:%M} - {:%H:%M}'.format(start_time, end_time))
+            for start_time, end_time in get_slot_schedule()
+        ]
 
     order_date = forms.DateField(widget=forms.TextInput(attrs={'type': 'date'}))
+    slot_start = forms.TypedChoiceField(coerce=parse_time, empty_value=None, required=False, label='Время получения')
 
     class Meta:
         model = Order
@@ -0,0 +1,55 @@
+import time
+from decimal import Decimal
+
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from django.core.management.base import BaseCommand
+
+from mainapp.api.fast import get_value_converters, get_values_queryset, serialize_values, render_json
+from mainapp.api.serializers import PizzaProductSerializer
+from mainapp.models import Category, PizzaProduct
+
+
+class Command(BaseCommand):
+
+    help = 'Сравнивает скорость PizzaProductSerializer и быстрой сериализации через values()'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Кол-во временных товаров')
+        parser.add_argument('--repeat', type=int, default=3, help='Кол-во повторов каждого замера')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            category = Category.objects.create(name='Benchmark', slug='benchmark-serializers')
+            PizzaProduct.objects.bulk_create([
+                PizzaProduct(
+                    category=category, title=f'Пицца {i}', slug=f'benchmark-pizza-{i}', image='pizza.jpg',
+                    description='Описание', price=Decimal('10.00'), size='26см', board='Без борта', dough='Толстое'
+                )
+                for i in range(options['rows'])
+            ])
+            request = Request(APIRequestFactory().get('/api/pizza/', SERVER_NAME='localhost'))
+            queryset = PizzaProduct.objects.filter(category=category).order_by('-pk')
+            serializer_time = self.measure(options['repeat'], lambda: JSONRenderer().render(
+                PizzaProductSerializer(queryset, many=True, context={'request': request}).data
+            ))
+            converters = get_value_converters(PizzaProductSerializer(context={'request': request}))
+            fast_time = self.measure(options['repeat'], lambda: render_json(
+                serialize_values(get_values_queryset(queryset, converters), converters)
+            ))
+            transaction.set_rollback(True)
+        self.stdout.write(f'Строк: {options["rows"]}')
+        self.stdout.write(f'ModelSerializer: {serializer_time:.3f} с')
+        self.stdout.write(f'values() + быстрый JSON: {fast_time:.3f} с')
+        self.stdout.write(f'Ускорение: {serializer_time / fast_time:.1f}x')
+
+    @staticmethod
+    def measure(repeat, func):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from mainapp.models import Category
+
+
+class Command(BaseCommand):
+
+    help = 'Сверяет счётчики товаров категорий с реальным кол-вом товаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Исправить счётчики с расхождениями')
+
+    def handle(self, *args, **options):
+        real_counts = Category.objects.get_real_products_counts()
+        wrong_categories = 0
+        for category in Category.objects.only('name', 'products_count'):
+            real_count = real_counts.get(category.id, 0)
+            if category.products_count == real_count:
+                continue
+            wrong_categories += 1
+            self.stdout.write(f'Категория {category.name}: счётчик {category.products_count} (ожидалось {real_count})')
+            if options['fix']:
+                Category.objects.filter(id=category.id).update(products_count=real_count)
+        self.stdout.write(f'Категорий с расхождениями: {wrong_categories}')
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from mainapp.export import EXPORTS, EXPORT_OUTPUTS, EXPORT_CHUNK_SIZE, stream_export
+
+
+class Command(BaseCommand):
+
+    help = 'Потоково выгружает заказы, корзины или товары корзин в NDJSON или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=list(EXPORTS), help='Что выгружать')
+        parser.add_argument('--output', choices=list(EXPORT_OUTPUTS), default='ndjson', help='Формат выгрузки')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE, help='Размер пачки строк')
+        parser.add_argument('--file', help='Файл для записи (по умолчанию stdout)')
+
+    def handle(self, *args, **options):
+        chunks = stream_export(options['name'], options['output'], options['chunk_size'])
+        if not options['file']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['file'], 'w', encoding='utf-8', newline='') as export_file:
+            for chunk in chunks:
+                export_file.write(chunk)
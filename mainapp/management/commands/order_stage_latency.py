@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from mainapp.models import Order
+from mainapp.order_status import get_stage_latencies, LATENCY_PERCENTILES
+
+
+class Command(BaseCommand):
+
+    help = 'Выводит перцентили времени нахождения заказов в каждом статусе'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='За сколько последних дней учитывать переходы')
+
+    def handle(self, *args, **options):
+        latencies = get_stage_latencies(since=timezone.now() - timedelta(days=options['days']))
+        if not latencies:
+            self.stdout.write('Нет переходов за выбранный период')
+            return
+        self.stdout.write('Статус\tПереходов\t' + '\t'.join(f'p{q}, с' for q in LATENCY_PERCENTILES))
+        for status, title in Order.STATUS_CHOICES:
+            if status not in latencies:
+                continue
+            stats = latencies[status]
+            self.stdout.write(
+                f'{title}\t{stats["count"]}\t' + '\t'.join(f'{stats[f"p{q}"]:.1f}' for q in LATENCY_PERCENTILES)
+            )
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from mainapp.models import Cart
+from mainapp.utils import recalc_cart, get_carts_with_wrong_totals
+
+
+class Command(BaseCommand):
+
+    help = 'Сверяет итоги корзин (total_products, final_price) с полным пересчётом по товарам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Пересчитать корзины с расхождениями')
+        parser.add_argument('--open-only', action='store_true', help='Проверять только корзины не в заказе')
+
+    def handle(self, *args, **options):
+        queryset = Cart.objects.all()
+        if options['open_only']:
+            queryset = queryset.filter(in_order=False)
+        wrong_carts = 0
+        for cart in get_carts_with_wrong_totals(queryset).iterator():
+            wrong_carts += 1
+            self.stdout.write(
+                f'Корзина {cart.id}: товаров {cart.total_products} (ожидалось {cart.lines_count}), '
+                f'сумма {cart.final_price} (ожидалось {cart.lines_sum})'
+            )
+            if options['fix']:
+                recalc_cart(cart)
+        self.stdout.write(f'Корзин с расхождениями: {wrong_carts}')
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.25 on 2026-10-17 18:41
+
+from django.db import migrations, models
+
+
+def remove_duplicate_cart_products(apps, schema_editor):
+    CartProduct = apps.get_model('mainapp', 'CartProduct')
+    Cart = apps.get_model('mainapp', 'Cart')
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    duplicates = (
+        CartProduct.objects.values('cart', 'content_type', 'object_id')
+        .annotate(min_id=models.Min('id'), lines=models.Count('id'))
+        .filter(lines__gt=1)
+    )
+    for duplicate in duplicates:
+        CartProduct.objects.filter(
+            cart=duplicate['cart'], content_type=duplicate['content_type'], object_id=duplicate['object_id']
+        ).exclude(id=duplicate['min_id']).delete()
+        cart = Cart.objects.get(id=duplicate['cart'])
+        cart_data = cart.products.aggregate(models.Sum('final_price'), models.Count('id'))
+        cart.final_price = cart_data['final_price__sum'] or 0
+        cart.total_products = cart_data['id__count']
+        cart.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0014_remove_customer_orders'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_cart_products, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartproduct',
+            constraint=models.UniqueConstraint(fields=('cart', 'content_type', 'object_id'), name='unique_cart_product'),
+        ),
+    ]
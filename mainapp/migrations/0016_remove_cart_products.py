@@ -0,0 +1,47 @@
+# Generated by Django 3.2.25 on 2026-10-17 18:43
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fold_cart_products_into_fk(apps, schema_editor):
+    Cart = apps.get_model('mainapp', 'Cart')
+    CartProduct = apps.get_model('mainapp', 'CartProduct')
+    Through = Cart.products.through
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    moved_lines = Through.objects.exclude(cartproduct__cart_id=models.F('cart_id')).values_list('cartproduct_id', 'cart_id')
+    for cartproduct_id, cart_id in moved_lines:
+        line = CartProduct.objects.filter(id=cartproduct_id).first()
+        if line is None:
+            continue
+        existing = CartProduct.objects.filter(
+            cart_id=cart_id, content_type_id=line.content_type_id, object_id=line.object_id
+        ).first()
+        if existing is None:
+            CartProduct.objects.filter(id=line.id).update(cart_id=cart_id)
+            continue
+        CartProduct.objects.filter(id=existing.id).update(
+            qty=models.F('qty') + line.qty, final_price=models.F('final_price') + line.final_price
+        )
+        line.delete()
+    lines = CartProduct.objects.filter(cart=models.OuterRef('pk')).order_by().values('cart')
+    Cart.objects.filter(in_order=False).update(
+        total_products=Coalesce(models.Subquery(lines.annotate(count=models.Count('id')).values('count')), 0),
+        final_price=Coalesce(models.Subquery(lines.annotate(sum=models.Sum('final_price')).values('sum')), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0015_cartproduct_unique_cart_product'),
+    ]
+
+    operations = [
+        migrations.RunPython(fold_cart_products_into_fk, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='cart',
+            name='products',
+        ),
+    ]
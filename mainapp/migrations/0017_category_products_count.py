@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-17 18:48
+
+from django.db import migrations, models
+
+
+def fill_products_count(apps, schema_editor):
+    Category = apps.get_model('mainapp', 'Category')
+    for model_name in ('PizzaProduct', 'BeerProduct'):
+        model = apps.get_model('mainapp', model_name)
+        for row in model.objects.order_by().values('category').annotate(count=models.Count('id')):
+            Category.objects.filter(id=row['category']).update(products_count=models.F('products_count') + row['count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0016_remove_cart_products'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='products_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Кол-во товаров'),
+        ),
+        migrations.RunPython(fill_products_count, migrations.RunPython.noop),
+    ]
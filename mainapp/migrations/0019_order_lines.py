@@ -0,0 +1,59 @@
+# Generated by Django 3.2.25 on 2026-10-17 19:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def snapshot_order_lines(apps, schema_editor):
+    Order = apps.get_model('mainapp', 'Order')
+    OrderLine = apps.get_model('mainapp', 'OrderLine')
+    CartProduct = apps.get_model('mainapp', 'CartProduct')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    content_types = {content_type.id: content_type for content_type in ContentType.objects.all()}
+    orders = Order.objects.exclude(cart=None).select_related('cart').order_by('id')
+    for order in orders.iterator(chunk_size=500):
+        Order.objects.filter(id=order.id).update(final_price=order.cart.final_price)
+        lines = []
+        for cart_product in CartProduct.objects.filter(cart_id=order.cart_id).order_by('id'):
+            content_type = content_types[cart_product.content_type_id]
+            product = apps.get_model(content_type.app_label, content_type.model).objects.filter(
+                id=cart_product.object_id
+            ).first()
+            if product is None:
+                continue
+            lines.append(OrderLine(
+                order_id=order.id, product_type=content_type.model, product_id=product.id, title=product.title,
+                image=product.image.name, unit_price=product.price, qty=cart_product.qty,
+                final_price=cart_product.final_price
+            ))
+        OrderLine.objects.bulk_create(lines)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0018_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='final_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=9, verbose_name='Общая цена'),
+        ),
+        migrations.CreateModel(
+            name='OrderLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_type', models.CharField(max_length=100, verbose_name='Тип товара')),
+                ('product_id', models.PositiveIntegerField(verbose_name='Id товара')),
+                ('title', models.CharField(max_length=255, verbose_name='Наименование')),
+                ('image', models.ImageField(blank=True, upload_to='', verbose_name='Изображение')),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=9, verbose_name='Цена')),
+                ('qty', models.PositiveIntegerField(verbose_name='Кол-во')),
+                ('final_price', models.DecimalField(decimal_places=2, max_digits=9, verbose_name='Общая цена')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='mainapp.order', verbose_name='Заказ')),
+            ],
+        ),
+        migrations.RunPython(snapshot_order_lines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.2.25 on 2026-10-17 19:04
+
+from django.db import migrations, models
+
+
+def fill_customer_order_totals(apps, schema_editor):
+    Customer = apps.get_model('mainapp', 'Customer')
+    Order = apps.get_model('mainapp', 'Order')
+    totals = Order.objects.order_by().values('customer').annotate(
+        orders_count=models.Count('id'), lifetime_spend=models.Sum('final_price')
+    )
+    for row in totals:
+        Customer.objects.filter(user_id=row['customer']).update(
+            orders_count=row['orders_count'], lifetime_spend=row['lifetime_spend']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0019_order_lines'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='lifetime_spend',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Сумма заказов'),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='orders_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Кол-во заказов'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Дата создания заказа'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', '-created_at', '-id'], name='order_customer_history_idx'),
+        ),
+        migrations.RunPython(fill_customer_order_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.25 on 2026-10-17 19:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0021_order_status_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliverySlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('start_time', models.TimeField(verbose_name='Начало')),
+                ('end_time', models.TimeField(verbose_name='Конец')),
+                ('capacity', models.PositiveIntegerField(verbose_name='Вместимость')),
+                ('available', models.PositiveIntegerField(verbose_name='Свободно')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='deliveryslot',
+            constraint=models.UniqueConstraint(fields=('date', 'start_time'), name='unique_delivery_slot'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='slot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='mainapp.deliveryslot', verbose_name='Слот получения'),
+        ),
+    ]
@@ -1,15 +1,22 @@
 
-from django.db import models
+from collections import Counter
+
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from PIL import Image
 from io import BytesIO
 from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.exceptions import ValidationError
 import sys
 from django.urls import reverse
 from django.utils import timezone
 from .custom_logging import logger
+from .registry import product_registry
+from .caching import get_cached, bump_versions
+from .events import publish_order_event
 
 User = get_user_model()
 # Create your models here.
@@ -27,12 +34,6 @@ User = get_user_model()
 
 # /categories/pizza
 
-def get_models_for_count(*model_names):
-    logger.debug('Использование функции подсчёта кол-ва товара')
-    return [models.Count(model_name) for model_name in model_names]
-
-
-
 def get_product_url(obj, viewname):
     logger.debug('Использование получения урла продукта')
     ct_model = obj.__class__._meta.model_name
@@ -56,17 +57,23 @@ class LatestProductManager:
     def get_products_for_main_page(*args, **kwargs):
         logger.debug('Взятие продуктов для главной страницф')
         with_respect_to = kwargs.get('with_respect_to')
+        ct_models = [ct_model for ct_model in args if ct_model in product_registry]
+        name = 'main_page_feed:{}:{}'.format(','.join(ct_models), with_respect_to)
+        return get_cached(
+            name, ct_models, lambda: LatestProductManager.build_products_for_main_page(ct_models, with_respect_to)
+        )
+
+    @staticmethod
+    def build_products_for_main_page(ct_models, with_respect_to=None):
         products = []
-        ct_models = ContentType.objects.filter(model__in=args)
         for ct_model in ct_models:
-            model_products = ct_model.model_class()._base_manager.all().order_by('-id')[:5]
-            products.extend(model_products)
+            model_products = product_registry.get_model(ct_model)._base_manager.all().order_by('-id')[:5]
+            products.extend(product.get_record() for product in model_products)
         if with_respect_to:
-            ct_model = ContentType.objects.filter(model=with_respect_to)
-            if ct_model.exists():
-                if with_respect_to in args:
+            if with_respect_to in product_registry:
+                if with_respect_to in ct_models:
                     return sorted(
-                        products, key=lambda x: x.__class__._meta.model_name.startswith(with_respect_to), reverse=True
+                        products, key=lambda x: x['ct_model'].startswith(with_respect_to), reverse=True
                     )
         return products
 
@@ -76,20 +83,41 @@ class LatestProducts:
 
 class CategoryManager(models.Manager):
 
-    CATEGORY_NAME_COUNT_NAME = {
-        'Пицца': 'pizzaproduct__count',
-        'Пиво': 'beerproduct__count'
-    }
-
     def get_queryset(self):
         return super().get_queryset()
+
+    def update_products_count(self, category_id, delta):
+        logger.debug('Обновление счётчика товаров категории')
+        updated = self.get_queryset().filter(id=category_id, products_count__gte=-delta).update(
+            products_count=models.F('products_count') + delta
+        )
+        if not updated and self.get_queryset().filter(id=category_id).exists():
+            logger.warning(f'Счётчик товаров категории {category_id} разошёлся с товарами, выполняется пересчёт')
+            self.get_queryset().filter(id=category_id).update(
+                products_count=self.get_real_products_counts().get(category_id, 0)
+            )
+
+    def apply_products_count_deltas(self, deltas):
+        for category_id, delta in deltas.items():
+            if delta:
+                self.update_products_count(category_id, delta)
+
+    def get_real_products_counts(self):
+        counts = {}
+        for model in product_registry.models.values():
+            for row in model._base_manager.order_by().values('category').annotate(count=models.Count('id')):
+                counts[row['category']] = counts.get(row['category'], 0) + row['count']
+        return counts
     
     def get_categories_for_left_sidebar(self):
         logger.debug('Использование функции get_categories_for_left_sidebar')
-        models = get_models_for_count('pizzaproduct', 'beerproduct')
-        qs = list(self.get_queryset().annotate(*models))
+        scopes = [Category._meta.model_name, *product_registry.get_ct_models()]
+        return get_cached('left_sidebar', scopes, self.build_categories_for_left_sidebar)
+
+    def build_categories_for_left_sidebar(self):
+        qs = self.get_queryset().only('name', 'slug', 'products_count')
         data = [
-            dict(name=c.name, url=c.get_absolute_url(), count=getattr(c, self.CATEGORY_NAME_COUNT_NAME[c.name]))
+            dict(name=c.name, url=c.get_absolute_url(), count=c.products_count)
             for c in qs
         ]
         return data
@@ -98,6 +126,8 @@ class Category(models.Model):
 
     name = models.CharField(max_length=255, verbose_name="Имя категории")
     slug = models.SlugField(unique=True, db_index=True) #endpoint
+    products_count = models.PositiveIntegerField(default=0, verbose_name="Кол-во товаров")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
     objects = CategoryManager()
 
     def __str__(self):
@@ -107,6 +137,61 @@ class Category(models.Model):
         return reverse('category_detail', kwargs={'slug': self.slug})
     
 
+class ProductQuerySet(models.QuerySet):
+
+    def invalidate_catalog(self):
+        scopes = (Category._meta.model_name, self.model._meta.model_name)
+        transaction.on_commit(lambda: bump_versions(*scopes), using=self.db)
+
+    def update(self, **kwargs):
+        if 'category' not in kwargs and 'category_id' not in kwargs:
+            with transaction.atomic(using=self.db):
+                self.invalidate_catalog()
+                return super().update(**kwargs)
+        category = kwargs.get('category', kwargs.get('category_id'))
+        category_id = getattr(category, 'pk', category)
+        with transaction.atomic(using=self.db):
+            rows = list(self.select_for_update().values_list('id', 'category_id'))
+            updated = self.model._base_manager.filter(id__in=[row_id for row_id, _ in rows]).update(**kwargs)
+            deltas = Counter()
+            for _, old_category_id in rows:
+                deltas[old_category_id] -= 1
+                deltas[category_id] += 1
+            Category.objects.apply_products_count_deltas(deltas)
+            self.invalidate_catalog()
+        return updated
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            Category.objects.apply_products_count_deltas(Counter(obj.category_id for obj in objs))
+            self.invalidate_catalog()
+        for obj in objs:
+            obj._loaded_category_id = obj.category_id
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if 'category' not in fields and 'category_id' not in fields:
+            with transaction.atomic(using=self.db):
+                self.invalidate_catalog()
+                return super().bulk_update(objs, fields, *args, **kwargs)
+        with transaction.atomic(using=self.db):
+            old_category_ids = dict(
+                self.model._base_manager.select_for_update().filter(id__in=[obj.pk for obj in objs]).values_list('id', 'category_id')
+            )
+            updated = super().bulk_update(objs, fields, *args, **kwargs)
+            deltas = Counter()
+            for obj in objs:
+                if obj.pk in old_category_ids and old_category_ids[obj.pk] != obj.category_id:
+                    deltas[old_category_ids[obj.pk]] -= 1
+                    deltas[obj.category_id] += 1
+            Category.objects.apply_products_count_deltas(deltas)
+            self.invalidate_catalog()
+        for obj in objs:
+            obj._loaded_category_id = obj.category_id
+        return updated
+
+
 class Product(models.Model):
 
     MIN_RESOLUTION = (200, 200)
@@ -122,12 +207,40 @@ class Product(models.Model):
     image = models.ImageField()
     description = models.TextField(verbose_name="Описание")
     price = models.DecimalField(max_digits=9, decimal_places=2, verbose_name="Цена")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
+    objects = ProductQuerySet.as_manager()
 
     def __str__(self):
         return self.title
 
     def get_model_name(self):
         return self.__class__.__name__.lower()
+
+    def get_record(self):
+        return dict(
+            id=self.id,
+            ct_model=self._meta.model_name,
+            title=self.title,
+            slug=self.slug,
+            price=self.price,
+            image_url=self.image.url,
+            url=self.get_absolute_url()
+        )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_category_id = instance.__dict__.get('category_id')
+        return instance
+
+    def update_category_counters(self, adding):
+        old_category_id = getattr(self, '_loaded_category_id', None)
+        if adding:
+            Category.objects.update_products_count(self.category_id, 1)
+        elif old_category_id is not None and old_category_id != self.category_id:
+            Category.objects.update_products_count(old_category_id, -1)
+            Category.objects.update_products_count(self.category_id, 1)
+        self._loaded_category_id = self.category_id
     
     def save(self, *args, **kwargs):
         logger.info('Сохранение нового продукта')
@@ -154,7 +267,10 @@ class Product(models.Model):
             filestream.seek(0)
             name = '{}.{}'.format(*self.image.name.split('.'))
             self.image = InMemoryUploadedFile(filestream, 'ImageField', name, 'jpeg/image', sys.getsizeof(filestream), None) 
-        super().save(*args, **kwargs)
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.update_category_counters(adding)
 
 
 class CartProduct(models.Model):
@@ -166,6 +282,11 @@ class CartProduct(models.Model):
     qty = models.PositiveIntegerField(default=1)
     final_price = models.DecimalField(max_digits=9, decimal_places=2, verbose_name="Общая цена")
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'content_type', 'object_id'], name='unique_cart_product')
+        ]
+
     def __str__(self):
         return "Продукт: {} (для корзины)".format(self.content_object.title)
     
@@ -177,7 +298,6 @@ class CartProduct(models.Model):
 class Cart(models.Model):
 
     owner = models.ForeignKey('Customer', null=True, verbose_name="Владелец", on_delete=models.CASCADE, db_index=True)
-    products = models.ManyToManyField(CartProduct, blank=True, related_name="related_cart")
     total_products = models.PositiveIntegerField(default=0)
     final_price = models.DecimalField(max_digits=9, default=0, decimal_places=2, verbose_name="Общая цена")
     in_order = models.BooleanField(default=False, db_index=True)
@@ -187,12 +307,45 @@ class Cart(models.Model):
         return str(self.id)
 
 
+class CustomerManager(models.Manager):
+
+    def update_order_totals(self, customer_id, orders_delta, spend_delta):
+        logger.debug('Обновление итогов заказов покупателя')
+        updated = self.get_queryset().filter(
+            user_id=customer_id, orders_count__gte=-orders_delta, lifetime_spend__gte=-spend_delta
+        ).update(
+            orders_count=models.F('orders_count') + orders_delta,
+            lifetime_spend=models.F('lifetime_spend') + spend_delta
+        )
+        if not updated and self.get_queryset().filter(user_id=customer_id).exists():
+            logger.warning(f'Итоги заказов покупателя {customer_id} разошлись с заказами, выполняется пересчёт')
+            self.get_queryset().filter(user_id=customer_id).update(**self.get_real_order_totals(customer_id))
+
+    def apply_order_totals_deltas(self, deltas):
+        totals = {}
+        for customer_id, orders_delta, spend_delta in deltas:
+            orders_count, spend = totals.get(customer_id, (0, 0))
+            totals[customer_id] = (orders_count + orders_delta, spend + spend_delta)
+        for customer_id, (orders_count, spend) in totals.items():
+            if orders_count or spend:
+                self.update_order_totals(customer_id, orders_count, spend)
+
+    def get_real_order_totals(self, customer_id):
+        return Order._base_manager.filter(customer_id=customer_id).aggregate(
+            orders_count=models.Count('id'),
+            lifetime_spend=Coalesce(models.Sum('final_price'), 0, output_field=models.DecimalField())
+        )
+
+
 class Customer(models.Model):
 
     user = models.OneToOneField(User, verbose_name="Пользователь", primary_key=True, on_delete=models.CASCADE, db_index=True)
     phone = models.CharField(max_length=20,verbose_name="Номер телефона", null=True, blank=True)
     address = models.CharField(max_length=255,verbose_name="Адрес", null=True, blank=True)
+    orders_count = models.PositiveIntegerField(default=0, verbose_name="Кол-во заказов")
+    lifetime_spend = models.DecimalField(max_digits=12, default=0, decimal_places=2, verbose_name="Сумма заказов")
     # orders = models.ManyToManyField("Order", blank=True, related_name="related_customer", verbose_name="Заказы покупателя")
+    objects = CustomerManager()
 
     def __str__(self):
         return "Покупатель: {} {}".format(self.user.first_name, self.user.last_name)
@@ -200,6 +353,14 @@ class Customer(models.Model):
 
 class PizzaProduct(Product):
 
+    CATEGORY_SLUG = 'pizza'
+    SPECIFICATION = {
+        "Размер": 'size',
+        'Борт': "board",
+        "Тесто": 'dough',
+        "Вегетарианская": 'vegetarian'
+    }
+
     size = models.CharField(max_length=255, verbose_name="Размер")
     board = models.CharField(max_length=255, verbose_name="Борт")
     dough = models.CharField(max_length=255, verbose_name="Тесто")
@@ -211,6 +372,15 @@ class PizzaProduct(Product):
         return get_product_url(self, 'product_detail')
 
 class BeerProduct(Product):
+
+    CATEGORY_SLUG = 'beer'
+    SPECIFICATION = {
+        "Цвет": 'colour',
+        'Крепость': "alcohol_strength",
+        "Фильтрация": 'filtered',
+        "Сорт": 'grade'
+    }
+
     colour = models.CharField(max_length=255, verbose_name="Цвет")
     alcohol_strength = models.CharField(max_length=255, verbose_name="Крепость") 
     filtered = models.CharField(max_length=255, verbose_name="Фильтрация")
@@ -222,6 +392,87 @@ class BeerProduct(Product):
         return get_product_url(self, 'product_detail')
 
 
+class DeliverySlotManager(models.Manager):
+
+    def reserve(self, slot_id):
+        return bool(self.get_queryset().filter(id=slot_id, available__gt=0).update(available=models.F('available') - 1))
+
+    def release(self, slot_id):
+        self.get_queryset().filter(id=slot_id, available__lt=models.F('capacity')).update(available=models.F('available') + 1)
+
+
+class DeliverySlot(models.Model):
+
+    date = models.DateField(verbose_name='Дата')
+    start_time = models.TimeField(verbose_name='Начало')
+    end_time = models.TimeField(verbose_name='Конец')
+    capacity = models.PositiveIntegerField(verbose_name='Вместимость')
+    available = models.PositiveIntegerField(verbose_name='Свободно')
+    objects = DeliverySlotManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'start_time'], name='unique_delivery_slot')
+        ]
+
+    def __str__(self):
+        return "Слот {} {}-{}".format(self.date, self.start_time, self.end_time)
+
+
+class TransitionError(Exception):
+    pass
+
+
+def check_transition(from_status, to_status):
+    if to_status not in Order.STATUS_TRANSITIONS[from_status]:
+        raise TransitionError(f'Переход {from_status} -> {to_status} запрещён')
+
+
+class OrderQuerySet(models.QuerySet):
+
+    def update(self, **kwargs):
+        tracks_totals = bool({'customer', 'customer_id', 'final_price'} & set(kwargs))
+        if 'status' not in kwargs and not tracks_totals:
+            return super().update(**kwargs)
+        if not isinstance(kwargs.get('status', ''), str):
+            raise TypeError('Статус заказа меняется только конкретным значением')
+        with transaction.atomic(using=self.db):
+            if 'status' in kwargs:
+                pks = [order.pk for order in self.update_status(kwargs.pop('status'))]
+            else:
+                pks = list(self.select_for_update().values_list('pk', flat=True))
+            if kwargs:
+                orders = self.model._base_manager.filter(pk__in=pks)
+                old_totals = list(orders.values_list('customer_id', 'final_price')) if tracks_totals else []
+                orders.update(**kwargs)
+                if tracks_totals:
+                    Customer.objects.apply_order_totals_deltas(
+                        [(customer_id, -1, -final_price) for customer_id, final_price in old_totals] +
+                        [(customer_id, 1, final_price) for customer_id, final_price in orders.values_list('customer_id', 'final_price')]
+                    )
+        return len(pks)
+
+    def update_status(self, status):
+        with transaction.atomic(using=self.db):
+            orders = list(self.select_for_update().order_by('pk'))
+            if not orders:
+                return []
+            changed = [order for order in orders if order.status != status]
+            for from_status in {order.status for order in changed}:
+                check_transition(from_status, status)
+            self.model._base_manager.filter(pk__in=[order.pk for order in orders]).update(status=status)
+            now = timezone.now()
+            OrderStatusEvent.objects.bulk_create([
+                OrderStatusEvent(order=order, from_status=order.status, to_status=status, created_at=now)
+                for order in changed
+            ])
+            for order in orders:
+                order.status = order._loaded_status = status
+            for order in changed:
+                publish_order_event(order, 'status_changed')
+        return orders
+
+
 class Order(models.Model):
 
     STATUS_NEW = 'new'
@@ -246,6 +497,14 @@ class Order(models.Model):
         (BUYING_TYPE_DELIVERY, 'Доставка')
     )
 
+    STATUS_TRANSITIONS = {
+        STATUS_NEW: (STATUS_PAYED, STATUS_IN_PROGRESS),
+        STATUS_PAYED: (STATUS_IN_PROGRESS,),
+        STATUS_IN_PROGRESS: (STATUS_READY,),
+        STATUS_READY: (STATUS_COMPLETED,),
+        STATUS_COMPLETED: (),
+    }
+
     customer = models.ForeignKey('Customer', verbose_name='Покупатель', related_name="related_orders", on_delete=models.CASCADE, db_index=True)
     first_name = models.CharField(max_length=255, verbose_name='Имя')
     last_name = models.CharField(max_length=255, verbose_name='Фамилия')
@@ -265,8 +524,70 @@ class Order(models.Model):
         default=BUYING_TYPE_SELF
     )
     comment = models.TextField(verbose_name="Комментарий к заказу", null=True, blank=True)
-    created_at = models.DateTimeField(auto_now=True, verbose_name="Дата создания заказа")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания заказа")
     order_date = models.DateField(verbose_name="Дата получения заказа", default=timezone.now)
+    slot = models.ForeignKey(DeliverySlot, verbose_name='Слот получения', related_name='orders', null=True, blank=True, on_delete=models.SET_NULL)
+    final_price = models.DecimalField(max_digits=9, default=0, decimal_places=2, verbose_name="Общая цена")
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', '-created_at', '-id'], name='order_customer_history_idx')
+        ]
+
+    def __str__(self):
+        return str(self.id)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.__dict__.get('status')
+        instance._loaded_customer_id = instance.__dict__.get('customer_id')
+        instance._loaded_final_price = instance.__dict__.get('final_price')
+        return instance
+
+    def get_customer_totals_deltas(self, adding):
+        old_customer_id = getattr(self, '_loaded_customer_id', None)
+        old_final_price = getattr(self, '_loaded_final_price', None)
+        self._loaded_customer_id, self._loaded_final_price = self.customer_id, self.final_price
+        if adding:
+            return [(self.customer_id, 1, self.final_price)]
+        if old_customer_id is None:
+            return []
+        if old_customer_id != self.customer_id:
+            return [(old_customer_id, -1, -old_final_price), (self.customer_id, 1, self.final_price)]
+        if old_final_price != self.final_price:
+            return [(self.customer_id, 0, self.final_price - old_final_price)]
+        return []
+
+    def clean(self):
+        old_status = getattr(self, '_loaded_status', None)
+        if old_status is not None and old_status != self.status and self.status not in self.STATUS_TRANSITIONS[old_status]:
+            old_status_display = dict(self.STATUS_CHOICES)[old_status]
+            raise ValidationError({'status': f'Нельзя перевести заказ из статуса "{old_status_display}" в "{self.get_status_display()}"'})
+
+
+class OrderLine(models.Model):
+
+    order = models.ForeignKey(Order, verbose_name='Заказ', related_name='lines', on_delete=models.CASCADE)
+    product_type = models.CharField(max_length=100, verbose_name='Тип товара')
+    product_id = models.PositiveIntegerField(verbose_name='Id товара')
+    title = models.CharField(max_length=255, verbose_name='Наименование')
+    image = models.ImageField(blank=True, verbose_name='Изображение')
+    unit_price = models.DecimalField(max_digits=9, decimal_places=2, verbose_name='Цена')
+    qty = models.PositiveIntegerField(verbose_name='Кол-во')
+    final_price = models.DecimalField(max_digits=9, decimal_places=2, verbose_name='Общая цена')
+
+    def __str__(self):
+        return "Продукт: {} (для заказа {})".format(self.title, self.order_id)
+
+
+class OrderStatusEvent(models.Model):
+
+    order = models.ForeignKey(Order, verbose_name='Заказ', related_name='status_events', on_delete=models.CASCADE)
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, null=True, blank=True, verbose_name='Из статуса')
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, verbose_name='В статус')
+    created_at = models.DateTimeField(default=timezone.now, db_index=True, verbose_name='Время перехода')
 
     def __str__(self):
-        return str(self.id)
\ No newline at end of file
+        return "Заказ {}: {} -> {}".format(self.order_id, self.from_status, self.to_status)
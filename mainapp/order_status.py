@@ -0,0 +1,71 @@
+from collections import defaultdict
+
+from django.db.models import F, Window
+from django.db.models.functions import Lag
+from django.utils import timezone
+
+from .events import publish_order_event
+from .models import Order, OrderStatusEvent, check_transition
+from .custom_logging import logger
+
+
+LATENCY_PERCENTILES = (50, 90, 99)
+
+
+def record_created_orders(orders):
+    now = timezone.now()
+    OrderStatusEvent.objects.bulk_create([
+        OrderStatusEvent(order=order, from_status=None, to_status=order.status, created_at=now) for order in orders
+    ])
+    for order in orders:
+        order._loaded_status = order.status
+        publish_order_event(order, 'created')
+
+
+def bulk_transition(orders, from_status, to_status):
+    check_transition(from_status, to_status)
+    orders = orders.filter(status=from_status).update_status(to_status)
+    if orders:
+        logger.info(f'Переведено {len(orders)} заказов из {from_status} в {to_status}')
+    return orders
+
+
+def transition(order, to_status):
+    changed = bulk_transition(Order.objects.filter(pk=order.pk), order.status, to_status)
+    if changed:
+        order.status = order._loaded_status = to_status
+    return bool(changed)
+
+
+def get_stage_durations(since=None):
+    events = OrderStatusEvent.objects.all()
+    if since is not None:
+        events = events.filter(order_id__in=OrderStatusEvent.objects.filter(created_at__gte=since).values('order_id'))
+    events = events.annotate(
+        entered_at=Window(Lag('created_at'), partition_by=[F('order_id')], order_by=F('created_at').asc())
+    ).values_list('from_status', 'created_at', 'entered_at')
+    durations = defaultdict(list)
+    for from_status, left_at, entered_at in events:
+        if since is not None and left_at < since:
+            continue
+        if from_status is not None and entered_at is not None:
+            durations[from_status].append((left_at - entered_at).total_seconds())
+    return durations
+
+
+def percentile(values, q):
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def get_stage_latencies(since=None, percentiles=LATENCY_PERCENTILES):
+    return {
+        status: {
+            'count': len(durations),
+            **{f'p{q}': percentile(durations, q) for q in percentiles},
+        }
+        for status, durations in get_stage_durations(since).items()
+    }
@@ -0,0 +1,85 @@
+from django.db import transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .cart import get_cart_items
+from .utils import prefetch_content_objects
+from .models import Cart, CartProduct, Order, OrderLine
+from .slots import reserve_slot, reserve_earliest_slot
+from .custom_logging import logger
+
+
+ORDER_HISTORY_PAGE_SIZE = 10
+
+
+def make_order_line(item):
+    return OrderLine(
+        product_type=item.content_object._meta.model_name,
+        product_id=item.content_object.id,
+        title=item.content_object.title,
+        image=item.content_object.image.name,
+        unit_price=item.content_object.price,
+        qty=item.qty,
+        final_price=item.final_price,
+    )
+
+
+def build_order_lines(cart):
+    return [make_order_line(item) for item in get_cart_items(cart)]
+
+
+def create_order_lines(orders):
+    orders_by_cart = {order.cart_id: order for order in orders if order.cart_id is not None}
+    if not orders_by_cart:
+        return []
+    lines = []
+    for item in prefetch_content_objects(CartProduct.objects.filter(cart_id__in=orders_by_cart)):
+        line = make_order_line(item)
+        line.order = orders_by_cart[item.cart_id]
+        lines.append(line)
+    OrderLine.objects.bulk_create(lines)
+    Cart.objects.filter(id__in=orders_by_cart).update(in_order=True)
+    return lines
+
+
+def place_order(order, cart, slot_start=None, with_slot=True):
+    logger.info(f'Оформление заказа для корзины {cart.id}')
+    lines = build_order_lines(cart)
+    with transaction.atomic():
+        if with_slot and slot_start is None:
+            order.slot_id = reserve_earliest_slot(order.order_date)
+        elif with_slot:
+            order.slot_id = reserve_slot(order.order_date, slot_start)
+        order.cart = cart
+        order.final_price = cart.final_price
+        order.save(force_insert=True)
+        for line in lines:
+            line.order = order
+        OrderLine.objects.bulk_create(lines)
+        Cart.objects.filter(id=cart.id).update(in_order=True)
+    cart.in_order = True
+    return order
+
+
+def get_order_history_cursor(order):
+    return '{}_{}'.format(order.created_at.isoformat(), order.id)
+
+
+def parse_order_history_cursor(cursor):
+    try:
+        created_at, order_id = cursor.rsplit('_', 1)
+        created_at, order_id = parse_datetime(created_at), int(order_id)
+    except (AttributeError, ValueError):
+        return None
+    return (created_at, order_id) if created_at else None
+
+
+def get_order_history_page(customer, cursor=None, page_size=ORDER_HISTORY_PAGE_SIZE):
+    orders = Order.objects.filter(customer=customer).order_by('-created_at', '-id').prefetch_related('lines')
+    position = parse_order_history_cursor(cursor)
+    if position is not None:
+        created_at, order_id = position
+        orders = orders.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=order_id))
+    orders = list(orders[:page_size + 1])
+    next_cursor = get_order_history_cursor(orders[page_size - 1]) if len(orders) > page_size else None
+    return orders[:page_size], next_cursor
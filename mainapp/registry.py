@@ -0,0 +1,51 @@
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+
+from .custom_logging import logger
+
+
+class ProductTypeRegistry:
+
+    def __init__(self):
+        self.models = {}
+        self.category_slugs = {}
+        self.content_types_loaded = False
+
+    def __contains__(self, ct_model):
+        return ct_model in self.models
+
+    def register(self, model):
+        logger.debug(f'Регистрация типа товара {model._meta.model_name}')
+        self.models[model._meta.model_name] = model
+        self.category_slugs[model.CATEGORY_SLUG] = model
+        self.content_types_loaded = False
+
+    def autodiscover(self):
+        from .models import Product
+        for model in apps.get_models():
+            if issubclass(model, Product):
+                self.register(model)
+
+    def get_model(self, ct_model):
+        return self.models[ct_model]
+
+    def get_model_for_category(self, slug):
+        return self.category_slugs.get(slug)
+
+    def get_ct_models(self):
+        return list(self.models)
+
+    def get_specification(self, ct_model):
+        return self.models[ct_model].SPECIFICATION
+
+    def get_content_type(self, model):
+        if not self.content_types_loaded:
+            ContentType.objects.get_for_models(*self.models.values())
+            self.content_types_loaded = True
+        return ContentType.objects.get_for_model(model)
+
+    def get_model_for_content_type_id(self, content_type_id):
+        return ContentType.objects.get_for_id(content_type_id).model_class()
+
+
+product_registry = ProductTypeRegistry()
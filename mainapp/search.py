@@ -0,0 +1,229 @@
+import bisect
+import math
+import re
+import threading
+from collections import defaultdict
+
+from .caching import get_versions
+from .registry import product_registry
+from .custom_logging import logger
+
+
+TITLE_WEIGHT = 3
+DESCRIPTION_WEIGHT = 1
+MIN_SIMILARITY = 0.3
+PREFIX_SIMILARITY = 0.9
+SEARCH_LIMIT = 50
+AUTOCOMPLETE_LIMIT = 10
+
+WORD_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile(r'[а-я]')
+RV_RE = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+PERFECTIVE_GERUND_RE = re.compile(r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$')
+REFLEXIVE_RE = re.compile(r'(с[яь])$')
+ADJECTIVE_RE = re.compile(r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|ую|юю|ая|яя|ою|ею)$')
+PARTICIPLE_RE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB_RE = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)'
+    r'|((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+NOUN_RE = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+DERIVATIONAL_RE = re.compile(r'[^аеиоуыэюя][аеиоуыэюя]+[^аеиоуыэюя]+[аеиоуыэюя].*(?<=о)сть?$')
+SUPERLATIVE_RE = re.compile(r'(ейше|ейш)$')
+
+
+def normalize(text):
+    return text.casefold().replace('ё', 'е')
+
+
+def tokenize(text):
+    return WORD_RE.findall(normalize(text or ''))
+
+
+def stem(word):
+    if not CYRILLIC_RE.search(word):
+        return word
+    match = RV_RE.match(word)
+    if not match:
+        return word
+    start, rv = match.groups()
+    temp = PERFECTIVE_GERUND_RE.sub('', rv, 1)
+    if temp == rv:
+        rv = REFLEXIVE_RE.sub('', rv, 1)
+        temp = ADJECTIVE_RE.sub('', rv, 1)
+        if temp != rv:
+            rv = PARTICIPLE_RE.sub('', temp, 1)
+        else:
+            temp = VERB_RE.sub('', rv, 1)
+            rv = NOUN_RE.sub('', rv, 1) if temp == rv else temp
+    else:
+        rv = temp
+    rv = re.sub('и$', '', rv)
+    if DERIVATIONAL_RE.search(rv):
+        rv = re.sub('ость?$', '', rv)
+    temp = re.sub('ь$', '', rv)
+    if temp == rv:
+        rv = SUPERLATIVE_RE.sub('', rv, 1)
+        rv = re.sub('нн$', 'н', rv)
+    else:
+        rv = temp
+    return start + rv
+
+
+def get_trigrams(term):
+    padded = '  {} '.format(term)
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def get_prefix_entries(key, title):
+    tokens = tokenize(title)
+    return [(' '.join(tokens[position:]), position, key) for position in range(len(tokens))]
+
+
+class ProductSearchIndex:
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.versions = None
+        self.records = {}
+        self.postings = defaultdict(dict)
+        self.document_terms = {}
+        self.trigrams = defaultdict(set)
+        self.prefix_entries = []
+
+    def get_scopes(self):
+        return product_registry.get_ct_models()
+
+    def rebuild(self):
+        logger.info('Перестроение поискового индекса товаров')
+        with self.lock:
+            versions = dict(zip(self.get_scopes(), get_versions(*self.get_scopes())))
+            self.records, self.postings, self.document_terms = {}, defaultdict(dict), {}
+            self.trigrams = defaultdict(set)
+            self.prefix_entries = []
+            for model in product_registry.models.values():
+                for product in model._base_manager.all():
+                    self.add_product(product, index_prefixes=False)
+            self.build_prefix_index()
+            self.versions = versions
+
+    def ensure_fresh(self):
+        versions = dict(zip(self.get_scopes(), get_versions(*self.get_scopes())))
+        if versions != self.versions:
+            self.rebuild()
+
+    def add_product(self, product, index_prefixes=True):
+        key = (product._meta.model_name, product.id)
+        with self.lock:
+            self.remove_key(key)
+            weights = defaultdict(int)
+            for token in tokenize(product.title):
+                weights[stem(token)] += TITLE_WEIGHT
+            for token in tokenize(product.description):
+                weights[stem(token)] += DESCRIPTION_WEIGHT
+            for term, weight in weights.items():
+                if term not in self.postings:
+                    for trigram in get_trigrams(term):
+                        self.trigrams[trigram].add(term)
+                self.postings[term][key] = weight
+            self.document_terms[key] = set(weights)
+            self.records[key] = product.get_record()
+            if index_prefixes:
+                for entry in get_prefix_entries(key, product.title):
+                    bisect.insort(self.prefix_entries, entry)
+
+    def remove_key(self, key):
+        with self.lock:
+            for term in self.document_terms.pop(key, ()):
+                postings = self.postings[term]
+                postings.pop(key, None)
+                if not postings:
+                    del self.postings[term]
+                    for trigram in get_trigrams(term):
+                        self.trigrams[trigram].discard(term)
+            record = self.records.pop(key, None)
+            if record is not None:
+                for entry in get_prefix_entries(key, record['title']):
+                    index = bisect.bisect_left(self.prefix_entries, entry)
+                    if index < len(self.prefix_entries) and self.prefix_entries[index] == entry:
+                        del self.prefix_entries[index]
+
+    def apply_change(self, scope, version, product_id, product=None):
+        with self.lock:
+            if self.versions is None:
+                return
+            if self.versions.get(scope) != version - 1:
+                self.versions = None
+                return
+            if product is None:
+                self.remove_key((scope, product_id))
+            else:
+                self.add_product(product)
+            self.versions[scope] = version
+
+    def get_matching_terms(self, query_term):
+        if query_term in self.postings:
+            yield query_term, 1.0
+        query_trigrams = get_trigrams(query_term)
+        candidates = set()
+        for trigram in query_trigrams:
+            candidates |= self.trigrams.get(trigram, set())
+        candidates.discard(query_term)
+        for term in candidates:
+            if term.startswith(query_term):
+                yield term, PREFIX_SIMILARITY
+                continue
+            term_trigrams = get_trigrams(term)
+            similarity = len(query_trigrams & term_trigrams) / len(query_trigrams | term_trigrams)
+            if similarity >= MIN_SIMILARITY:
+                yield term, similarity
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        logger.debug(f'Поиск товаров по запросу {query}')
+        self.ensure_fresh()
+        query_terms = {stem(token) for token in tokenize(query)}
+        scores = defaultdict(float)
+        with self.lock:
+            documents_count = len(self.records) or 1
+            for query_term in query_terms:
+                best_scores = {}
+                for term, similarity in self.get_matching_terms(query_term):
+                    postings = self.postings[term]
+                    idf = math.log(1 + documents_count / len(postings))
+                    for key, weight in postings.items():
+                        best_scores[key] = max(best_scores.get(key, 0), weight * idf * similarity)
+                for key, score in best_scores.items():
+                    scores[key] += score
+            ranked = sorted(scores, key=lambda key: (-scores[key], self.records[key]['title']))
+            return [self.records[key] for key in ranked[:limit]]
+
+    def build_prefix_index(self):
+        entries = []
+        for key, record in self.records.items():
+            entries.extend(get_prefix_entries(key, record['title']))
+        entries.sort()
+        self.prefix_entries = entries
+
+    def autocomplete(self, prefix, limit=AUTOCOMPLETE_LIMIT):
+        prefix = ' '.join(tokenize(prefix))
+        if not prefix:
+            return []
+        self.ensure_fresh()
+        with self.lock:
+            entries = self.prefix_entries
+            matches = {}
+            index = bisect.bisect_left(entries, (prefix,))
+            while index < len(entries) and entries[index][0].startswith(prefix):
+                _, position, key = entries[index]
+                matches[key] = min(position, matches.get(key, position))
+                index += 1
+            ranked = sorted(matches, key=lambda key: (matches[key], self.records[key]['title']))
+            return [
+                {'title': self.records[key]['title'], 'url': self.records[key]['url']}
+                for key in ranked[:limit]
+            ]
+
+
+product_search = ProductSearchIndex()
@@ -0,0 +1,78 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .caching import bump_versions
+from .cart import merge_guest_cart
+from .events import publish_order_event
+from .models import Category, Customer, Order, OrderStatusEvent
+from .registry import product_registry
+from .search import product_search
+from .slots import release_slot
+
+
+@receiver(user_logged_in)
+def merge_guest_cart_on_login(sender, request, user, **kwargs):
+    merge_guest_cart(request, user)
+
+
+def invalidate_catalog_cache(sender, **kwargs):
+    transaction.on_commit(lambda: bump_versions(sender._meta.model_name))
+
+
+def update_search_index(sender, product_id, product=None):
+    scope = sender._meta.model_name
+
+    def apply_change():
+        version, = bump_versions(scope)
+        product_search.apply_change(scope, version, product_id, product)
+
+    transaction.on_commit(apply_change)
+
+
+def update_search_index_on_save(sender, instance, **kwargs):
+    update_search_index(sender, instance.id, instance)
+
+
+def update_search_index_on_delete(sender, instance, **kwargs):
+    update_search_index(sender, instance.id)
+
+
+def decrement_category_counter(sender, instance, **kwargs):
+    Category.objects.update_products_count(instance.category_id, -1)
+
+
+@receiver(post_save, sender=Order)
+def update_customer_order_totals(sender, instance, created, **kwargs):
+    Customer.objects.apply_order_totals_deltas(instance.get_customer_totals_deltas(created))
+
+
+@receiver(post_save, sender=Order)
+def track_order_status(sender, instance, created, **kwargs):
+    from_status = None if created else getattr(instance, '_loaded_status', instance.status)
+    if not created and from_status == instance.status:
+        return
+    instance._loaded_status = instance.status
+    OrderStatusEvent.objects.create(order=instance, from_status=from_status, to_status=instance.status)
+    publish_order_event(instance, 'created' if created else 'status_changed')
+
+
+@receiver(post_delete, sender=Order)
+def decrement_customer_order_totals(sender, instance, **kwargs):
+    Customer.objects.update_order_totals(instance.customer_id, -1, -instance.final_price)
+
+
+@receiver(post_delete, sender=Order)
+def release_order_slot(sender, instance, **kwargs):
+    if instance.slot_id is not None:
+        release_slot(instance.slot_id)
+
+
+post_save.connect(invalidate_catalog_cache, sender=Category)
+post_delete.connect(invalidate_catalog_cache, sender=Category)
+
+for model in product_registry.models.values():
+    post_save.connect(update_search_index_on_save, sender=model)
+    post_delete.connect(update_search_index_on_delete, sender=model)
+    post_delete.connect(decrement_category_counter, sender=model)
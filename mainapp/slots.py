@@ -0,0 +1,110 @@
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_time
+
+from .models import DeliverySlot
+from .custom_logging import logger
+
+
+class SlotUnavailable(Exception):
+    pass
+
+
+class SlotPassed(SlotUnavailable):
+    pass
+
+
+def get_slot_schedule():
+    start = datetime.combine(date.min, parse_time(settings.ORDER_SLOT_DAY_START))
+    end = datetime.combine(date.min, parse_time(settings.ORDER_SLOT_DAY_END))
+    step = timedelta(minutes=settings.ORDER_SLOT_MINUTES)
+    schedule = []
+    while start + step <= end:
+        schedule.append((start.time(), (start + step).time()))
+        start += step
+    return schedule
+
+
+def ensure_slots(dates):
+    DeliverySlot.objects.bulk_create([
+        DeliverySlot(
+            date=day, start_time=start_time, end_time=end_time,
+            capacity=settings.ORDER_SLOT_CAPACITY, available=settings.ORDER_SLOT_CAPACITY
+        )
+        for day in dates
+        for start_time, end_time in get_slot_schedule()
+    ], ignore_conflicts=True)
+
+
+def check_slot_day(day):
+    if isinstance(day, datetime):
+        day = timezone.localdate(day)
+    if day > timezone.localdate() + timedelta(days=settings.ORDER_SLOT_MAX_DAYS):
+        raise SlotUnavailable(f'Запись возможна не дальше чем на {settings.ORDER_SLOT_MAX_DAYS} дней вперёд')
+    return day
+
+
+def reserve_slot(day, start_time):
+    day = check_slot_day(day)
+    if start_time not in dict(get_slot_schedule()):
+        raise SlotUnavailable(f'Слота {start_time} нет в расписании')
+    if datetime.combine(day, start_time) <= timezone.localtime().replace(tzinfo=None):
+        raise SlotPassed(f'Слот {day} {start_time} уже прошёл')
+    slot_id = DeliverySlot.objects.filter(date=day, start_time=start_time).values_list('id', flat=True).first()
+    if slot_id is None:
+        ensure_slots([day])
+        slot_id = DeliverySlot.objects.get(date=day, start_time=start_time).id
+    if not DeliverySlot.objects.reserve(slot_id):
+        logger.warning(f'Слот {day} {start_time} заполнен')
+        raise SlotUnavailable(f'Слот {day} {start_time} заполнен')
+    return slot_id
+
+
+def reserve_earliest_slot(day):
+    day = check_slot_day(day)
+    now = timezone.localtime().replace(tzinfo=None)
+    start_times = [start_time for start_time, _ in get_slot_schedule() if datetime.combine(day, start_time) > now]
+    if not start_times:
+        raise SlotPassed(f'Слоты на {day} уже прошли')
+    slots = DeliverySlot.objects.filter(date=day, start_time__in=start_times, available__gt=0).order_by('start_time')
+    ensured = False
+    while True:
+        slot_id = slots.values_list('id', flat=True).first()
+        if slot_id is None:
+            if ensured or DeliverySlot.objects.filter(date=day).exists():
+                logger.warning(f'Свободных слотов на {day} нет')
+                raise SlotUnavailable(f'Свободных слотов на {day} нет')
+            ensure_slots([day])
+            ensured = True
+        elif DeliverySlot.objects.reserve(slot_id):
+            return slot_id
+
+
+def release_slot(slot_id):
+    DeliverySlot.objects.release(slot_id)
+
+
+def get_available_slots(date_from, date_to):
+    days = (date_to - date_from).days + 1
+    if days < 1 or days > settings.ORDER_SLOT_MAX_DAYS:
+        raise ValueError(f'Диапазон должен быть от 1 до {settings.ORDER_SLOT_MAX_DAYS} дней')
+    stored = {
+        (slot['date'], slot['start_time']): slot['available']
+        for slot in DeliverySlot.objects.filter(date__range=(date_from, date_to)).values('date', 'start_time', 'available')
+    }
+    now = timezone.localtime().replace(tzinfo=None)
+    slots = []
+    for offset in range(days):
+        day = date_from + timedelta(days=offset)
+        for start_time, end_time in get_slot_schedule():
+            if datetime.combine(day, start_time) <= now:
+                continue
+            slots.append({
+                'date': day,
+                'start_time': start_time,
+                'end_time': end_time,
+                'available': stored.get((day, start_time), settings.ORDER_SLOT_CAPACITY),
+            })
+    return slots
@@ -1,6 +1,7 @@
 from django import template
 from django.utils.safestring import mark_safe
 from ..custom_logging import logger
+from ..registry import product_registry
 
 register = template.Library()
 
@@ -24,25 +25,10 @@ TABLE_CONTENT = """
                     </tr>
                 """
 
-PRODUCT_SPEC = {
-    'pizzaproduct': {
-        "Размер":'size', 
-        'Борт':"board", 
-        "Тесто": 'dough', 
-        "Вегетарианская":'vegetarian'
-    },
-    'beerproduct': {
-        "Цвет":'colour', 
-        'Крепость':"alcohol_strength", 
-        "Фильтрация": 'filtered', 
-        "Сорт":'grade'
-    }     
-}
-
 def get_product_spec(product, model_name):
     logger.debug('Использование функции get_product_spec')
     table_content = ''
-    for name, value in PRODUCT_SPEC[model_name].items():
+    for name, value in product_registry.get_specification(model_name).items():
         table_content += TABLE_CONTENT.format(name=name, value=getattr(product, value))
     return table_content
 
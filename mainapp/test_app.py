@@ -1,22 +1,46 @@
+import json
+import os
+import re
+from datetime import time, timedelta
 from decimal import Decimal
 from unittest import mock
 from django.test import TestCase, RequestFactory
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
-from .models import Category, PizzaProduct, CartProduct, Cart, Customer
-from .views import CategoryDetailView, CheckoutView, recalc_cart, AddToCartView, BaseView, DeleteFromCartView, ProfileView, LoginView, BeerAddView, PizzaAddView
+from .models import Category, PizzaProduct, BeerProduct, CartProduct, Cart, Customer, LatestProducts, Order, OrderStatusEvent, DeliverySlot, TransitionError
+from .registry import product_registry
+from .views import CategoryDetailView, CheckoutView, AddToCartView, BaseView, DeleteFromCartView, ProfileView, LoginView, BeerAddView, PizzaAddView
 from PIL import Image
 from django.core.files.base import File
 from io import BytesIO
 from django.contrib.messages.storage.fallback import FallbackStorage
 import pytest
 from django.conf import settings
-from django.test import Client
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.db import connection, IntegrityError
+from django.db.models import F
+from django.core.cache import cache
+from django.contrib.sessions.backends.cache import SessionStore
+from .cart import get_cart_for_request, add_product, remove_product, change_qty, CART_SESSION_KEY, GUEST_CART_SESSION_KEY
+from .utils import recalc_cart, get_carts_with_wrong_totals
+from .search import product_search
+from .caching import get_cached, get_versions, bump_versions, check_shared_cache
+from .events import EventHub, ServerSentEventStream, check_events_spool, order_events
+from .order_status import bulk_transition, transition, get_stage_latencies, get_stage_durations
+from .slots import reserve_slot, reserve_earliest_slot, SlotUnavailable, SlotPassed
 
 
 User = get_user_model()
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
 @pytest.fixture
 def get_image_file1():
     name='pizza.jpg' 
@@ -82,9 +106,8 @@ def cart_product(db, customer, cart, pizzaproduct):
 
 @pytest.mark.parametrize("expected", [1, Decimal("100.0")])
 def test_add_to_cart_without_cls(cart, cart_product, expected):
-        cart.products.add(cart_product)
         recalc_cart(cart)
-        assert cart.products.count() , cart.final_price == expected
+        assert cart.related_products.count() , cart.final_price == expected
 
 
 @pytest.mark.parametrize("expected", [302, '/cart/'])
@@ -209,3 +232,852 @@ def test_pizzaadd_post_view(db, expected, category, pizzaproduct, get_image_file
 
 
 
+def test_cart_resolution_warm_session_single_query(user, cart, django_assert_num_queries):
+    factory = RequestFactory()
+    request = factory.get('')
+    request.user = user
+    request.session = SessionStore()
+    request.session[CART_SESSION_KEY] = cart.id
+    with django_assert_num_queries(1):
+        resolved = get_cart_for_request(request)
+    assert resolved == cart
+    assert resolved.owner.user_id == user.id
+
+
+def test_cart_resolution_stores_cart_in_session(user):
+    factory = RequestFactory()
+    request = factory.get('')
+    request.user = user
+    request.session = SessionStore()
+    cart = get_cart_for_request(request)
+    assert request.session[CART_SESSION_KEY] == cart.id
+    assert get_cart_for_request(request) == cart
+
+
+def test_guest_cart_kept_in_session_and_merged_on_login(user, pizzaproduct):
+    user.set_password('password')
+    user.save()
+    c = Client()
+    with CaptureQueriesContext(connection) as context:
+        response = c.get('/add-to-cart/pizzaproduct/test-slug/')
+    assert response.status_code == 302
+    assert not [query for query in context.captured_queries if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+    assert Cart.objects.count() == 0
+    assert CartProduct.objects.count() == 0
+    assert c.session[GUEST_CART_SESSION_KEY] == {'pizzaproduct:{}'.format(pizzaproduct.id): {'qty': 1, 'price': '100.00'}}
+    c.login(username='testuser', password='password')
+    cart = Cart.objects.get(owner__user=user, in_order=False)
+    assert cart.total_products == 1
+    assert cart.final_price == Decimal("100.0")
+    assert GUEST_CART_SESSION_KEY not in c.session
+
+
+def test_cart_totals_follow_mutations_without_reaggregation(user, customer, cart, pizzaproduct):
+    add_product(cart, pizzaproduct)
+    change_qty(cart, pizzaproduct, 3)
+    cart.refresh_from_db()
+    assert (cart.total_products, cart.final_price) == (1, Decimal("300.0"))
+    assert not get_carts_with_wrong_totals(Cart.objects.all()).exists()
+    remove_product(cart, pizzaproduct)
+    cart.refresh_from_db()
+    assert (cart.total_products, cart.final_price) == (0, Decimal("0"))
+
+
+def test_reconcile_finds_drifted_cart_totals(cart, cart_product):
+    assert list(get_carts_with_wrong_totals(Cart.objects.all())) == [cart]
+    recalc_cart(cart)
+    assert not get_carts_with_wrong_totals(Cart.objects.all()).exists()
+
+
+@pytest.fixture
+def logged_client(user, customer, cart):
+    user.set_password('password')
+    user.save()
+    c = Client()
+    c.login(username='testuser', password='password')
+    c.get('/cart/')
+    return c
+
+
+def test_add_to_cart_query_budget(logged_client, cart, pizzaproduct, django_assert_num_queries):
+    with django_assert_num_queries(7):
+        logged_client.get('/add-to-cart/pizzaproduct/test-slug/')
+    with django_assert_num_queries(7):
+        logged_client.get('/add-to-cart/pizzaproduct/test-slug/')
+    cart.refresh_from_db()
+    assert CartProduct.objects.filter(cart=cart).count() == 1
+    assert (cart.total_products, cart.final_price) == (1, Decimal("100.0"))
+
+
+def test_change_qty_query_budget(logged_client, cart, pizzaproduct, django_assert_num_queries):
+    logged_client.get('/add-to-cart/pizzaproduct/test-slug/')
+    with django_assert_num_queries(8):
+        logged_client.post('/change-qty/pizzaproduct/test-slug/', {'qty': 2})
+    cart.refresh_from_db()
+    assert (cart.total_products, cart.final_price) == (1, Decimal("200.0"))
+
+
+def test_delete_from_cart_query_budget(logged_client, cart, pizzaproduct, django_assert_num_queries):
+    logged_client.get('/add-to-cart/pizzaproduct/test-slug/')
+    with django_assert_num_queries(8):
+        logged_client.get('/delete-from-cart/pizzaproduct/test-slug/')
+    cart.refresh_from_db()
+    assert CartProduct.objects.filter(cart=cart).count() == 0
+    assert (cart.total_products, cart.final_price) == (0, Decimal("0"))
+
+
+def count_statements(func):
+    with CaptureQueriesContext(connection) as context:
+        func()
+    return len([query for query in context.captured_queries if 'SAVEPOINT' not in query['sql']])
+
+
+def test_cart_mutations_use_fewer_statements_than_recalc(cart, pizzaproduct):
+    content_type = product_registry.get_content_type(PizzaProduct)
+    cart.owner
+
+    def legacy_add():
+        CartProduct.objects.get_or_create(user=cart.owner, cart=cart, content_type=content_type, object_id=pizzaproduct.id)
+        recalc_cart(cart)
+
+    def legacy_change_qty():
+        cart_product = CartProduct.objects.get(cart=cart, content_type=content_type, object_id=pizzaproduct.id)
+        cart_product.qty = 2
+        cart_product.save()
+        recalc_cart(cart)
+
+    def legacy_remove():
+        CartProduct.objects.get(cart=cart, content_type=content_type, object_id=pizzaproduct.id).delete()
+        recalc_cart(cart)
+
+    before = [count_statements(legacy_add), count_statements(legacy_change_qty), count_statements(legacy_remove)]
+    after = [
+        count_statements(lambda: add_product(cart, pizzaproduct)),
+        count_statements(lambda: change_qty(cart, pizzaproduct, 2)),
+        count_statements(lambda: remove_product(cart, pizzaproduct)),
+    ]
+    assert after == [2, 3, 3]
+    assert all(new < old for new, old in zip(after, before))
+
+
+def test_add_product_only_ignores_duplicate_lines(cart, pizzaproduct):
+    add_product(cart, pizzaproduct)
+    add_product(cart, pizzaproduct)
+    assert CartProduct.objects.filter(cart=cart).count() == 1
+    error = IntegrityError('insert or update on table "mainapp_cartproduct" violates foreign key constraint')
+    with mock.patch('mainapp.cart.insert_cart_product', side_effect=error):
+        with pytest.raises(IntegrityError):
+            add_product(cart, pizzaproduct)
+
+
+@pytest.fixture
+def make_pizza(db, get_image_file1, category):
+    def make(slug):
+        image = get_image_file1
+        image.seek(0)
+        return PizzaProduct.objects.create(
+            category=category, title=slug, slug=slug, image=File(image, name='pizza.jpg'),
+            size='26см', board="Без борта", dough='Толстое', description="Test description", price=Decimal("100.0")
+        )
+    return make
+
+
+def test_cart_page_queries_do_not_grow_with_lines(logged_client, cart, make_pizza):
+    def get_cart_queries():
+        with CaptureQueriesContext(connection) as context:
+            response = logged_client.get('/cart/')
+        assert response.status_code == 200
+        return len(context)
+
+    add_product(cart, make_pizza('pizza-1'))
+    one_line_queries = get_cart_queries()
+    for i in range(2, 5):
+        add_product(cart, make_pizza(f'pizza-{i}'))
+    assert get_cart_queries() == one_line_queries
+
+
+def test_product_registry_resolves_types_without_queries(db, django_assert_num_queries):
+    with django_assert_num_queries(0):
+        assert product_registry.get_model('pizzaproduct') is PizzaProduct
+        assert product_registry.get_model_for_category('beer') is BeerProduct
+        assert product_registry.get_specification('pizzaproduct')['Тесто'] == 'dough'
+    assert set(product_registry.get_ct_models()) == {'pizzaproduct', 'beerproduct'}
+
+
+def test_left_sidebar_is_cached_until_catalog_changes(category, make_pizza, django_assert_num_queries, django_capture_on_commit_callbacks):
+    assert Category.objects.get_categories_for_left_sidebar()[0]['count'] == 0
+    with django_assert_num_queries(0):
+        Category.objects.get_categories_for_left_sidebar()
+    with django_capture_on_commit_callbacks(execute=True):
+        make_pizza('new-pizza')
+    assert Category.objects.get_categories_for_left_sidebar()[0]['count'] == 1
+
+
+def test_category_counter_follows_product_lifecycle(category, make_pizza):
+    beer_category = Category.objects.create(name='Пиво', slug='beer')
+    pizza = make_pizza('counted-pizza')
+    category.refresh_from_db()
+    assert category.products_count == 1
+    pizza = PizzaProduct.objects.get(id=pizza.id)
+    pizza.category = beer_category
+    pizza.save()
+    category.refresh_from_db()
+    beer_category.refresh_from_db()
+    assert (category.products_count, beer_category.products_count) == (0, 1)
+    PizzaProduct.objects.filter(id=pizza.id).delete()
+    beer_category.refresh_from_db()
+    assert beer_category.products_count == 0
+    assert Category.objects.get_real_products_counts() == {}
+
+
+def test_category_counter_follows_queryset_and_bulk_writes(category, make_pizza, django_capture_on_commit_callbacks):
+    def get_sidebar_counts():
+        counts = {item['name']: item['count'] for item in Category.objects.get_categories_for_left_sidebar()}
+        return [counts[category.name], counts['Пиво']]
+
+    beer_category = Category.objects.create(name='Пиво', slug='beer')
+    pizzas = [make_pizza(f'bulk-counted-{i}') for i in range(3)]
+    assert get_sidebar_counts() == [3, 0]
+    with django_capture_on_commit_callbacks(execute=True):
+        PizzaProduct.objects.filter(id__in=[pizzas[0].id, pizzas[1].id]).update(category=beer_category)
+    assert list(Category.objects.order_by('id').values_list('products_count', flat=True)) == [1, 2]
+    assert get_sidebar_counts() == [1, 2]
+    pizzas[2].category = beer_category
+    with django_capture_on_commit_callbacks(execute=True):
+        PizzaProduct.objects.bulk_update([pizzas[2]], ['category'])
+    assert get_sidebar_counts() == [0, 3]
+    with django_capture_on_commit_callbacks(execute=True):
+        created = PizzaProduct.objects.bulk_create([
+            PizzaProduct(category=category, title='bulk', slug='bulk-created', image='pizza.jpg', description='-',
+                         price=Decimal('1.00'), size='26см', board='Без борта', dough='Толстое')
+        ])
+    assert list(Category.objects.order_by('id').values_list('products_count', flat=True)) == [1, 3]
+    assert get_sidebar_counts() == [1, 3]
+    Category.objects.filter(id=category.id).update(products_count=0)
+    PizzaProduct.objects.filter(id=created[0].id).delete()
+    assert Category.objects.get(id=category.id).products_count == 0
+    assert Category.objects.get(id=beer_category.id).products_count == 3
+
+
+def test_main_page_feed_served_from_cache(pizzaproduct, django_assert_num_queries, django_capture_on_commit_callbacks, make_pizza):
+    feed = LatestProducts.objects.get_products_for_main_page('pizzaproduct', 'beerproduct', with_respect_to='pizzaproduct')
+    assert [product['slug'] for product in feed] == ['test-slug']
+    assert feed[0]['url'] == '/products/pizzaproduct/test-slug/'
+    with django_assert_num_queries(0):
+        LatestProducts.objects.get_products_for_main_page('pizzaproduct', 'beerproduct', with_respect_to='pizzaproduct')
+    with django_capture_on_commit_callbacks(execute=True):
+        make_pizza('newest-pizza')
+    feed = LatestProducts.objects.get_products_for_main_page('pizzaproduct', 'beerproduct', with_respect_to='pizzaproduct')
+    assert [product['slug'] for product in feed] == ['newest-pizza', 'test-slug']
+    response = Client().get('/')
+    assert response.status_code == 200
+    assert '/add-to-cart/pizzaproduct/newest-pizza/' in response.content.decode()
+
+
+def test_product_search_is_fuzzy_ranked_and_incremental(make_pizza, django_assert_num_queries, django_capture_on_commit_callbacks):
+    margherita = make_pizza('margherita')
+    margherita.title, margherita.description = 'Пицца Маргарита', 'Томаты и сыр'
+    margherita.save()
+    pepperoni = make_pizza('pepperoni')
+    pepperoni.title, pepperoni.description = 'Пицца Пепперони', 'Острая колбаса, маргарита по-новому'
+    pepperoni.save()
+    assert [record['slug'] for record in product_search.search('маргариту')] == ['margherita', 'pepperoni']
+    with django_assert_num_queries(0):
+        assert product_search.search('МАРГОРИТА')[0]['slug'] == 'margherita'
+        assert [record['slug'] for record in product_search.search('острой')] == ['pepperoni']
+        assert product_search.search('пепп')[0]['slug'] == 'pepperoni'
+    with django_capture_on_commit_callbacks(execute=True):
+        pepperoni.title = 'Пицца Четыре сыра'
+        pepperoni.save()
+    with django_assert_num_queries(0):
+        assert product_search.search('пепперони') == []
+        assert product_search.search('сыры')[0]['slug'] == 'pepperoni'
+    response = Client().get('/search/', {'q': 'сыр'})
+    assert '/add-to-cart/pizzaproduct/pepperoni/' in response.content.decode()
+    with django_capture_on_commit_callbacks(execute=True):
+        pepperoni.delete()
+    with django_assert_num_queries(0):
+        assert product_search.search('четыре') == []
+
+
+def test_autocomplete_matches_title_prefixes_without_queries(make_pizza, django_assert_num_queries, django_capture_on_commit_callbacks):
+    for slug, title in [('margherita', 'Пицца Маргарита'), ('marinara', 'Маринара'), ('pepperoni', 'Пицца Пепперони')]:
+        pizza = make_pizza(slug)
+        pizza.title = title
+        pizza.save()
+    Client().get('/api/autocomplete/', {'q': 'м'})
+    with django_assert_num_queries(0):
+        response = Client().get('/api/autocomplete/', {'q': 'МАР'})
+    assert [item['title'] for item in response.json()] == ['Маринара', 'Пицца Маргарита']
+    assert response.json()[1]['url'] == '/products/pizzaproduct/margherita/'
+    assert [item['title'] for item in Client().get('/api/autocomplete/', {'q': 'пицца п'}).json()] == ['Пицца Пепперони']
+    pepperoni = PizzaProduct.objects.get(slug='pepperoni')
+    with mock.patch.object(product_search, 'build_prefix_index', side_effect=AssertionError):
+        with django_capture_on_commit_callbacks(execute=True):
+            PizzaProduct.objects.get(slug='marinara').delete()
+            pepperoni.title = 'Маркиза'
+            pepperoni.save()
+        with django_assert_num_queries(0):
+            assert Client().get('/api/autocomplete/', {'q': 'мар', 'limit': 5}).json() == [
+                {'title': 'Маркиза', 'url': '/products/pizzaproduct/pepperoni/'},
+                {'title': 'Пицца Маргарита', 'url': '/products/pizzaproduct/margherita/'},
+            ]
+
+
+@pytest.fixture
+def staff_client(db):
+    User.objects.create_superuser(username='admin', password='password')
+    client = Client()
+    client.login(username='admin', password='password')
+    return client
+
+
+def test_api_lists_use_keyset_pagination(staff_client, customer):
+    for i in range(5):
+        Order.objects.create(customer=customer, first_name='Имя', last_name='Фамилия', phone=str(i))
+    pages, url = [], '/api/orders/?page_size=2'
+    while url:
+        with CaptureQueriesContext(connection) as context:
+            response = staff_client.get(url)
+        assert not any('COUNT(' in query['sql'] for query in context.captured_queries)
+        pages.append(([order['phone'] for order in response.json()['items']], len(context)))
+        url = response.json()['next']
+    assert [phones for phones, _ in pages] == [['4', '3'], ['2', '1'], ['0']]
+    assert len({queries for _, queries in pages}) == 1
+    Order.objects.bulk_create([
+        Order(customer=customer, first_name='Имя', last_name='Фамилия', phone=str(i)) for i in range(settings.API_MAX_PAGE_SIZE)
+    ])
+    response = staff_client.get('/api/orders/', {'page_size': settings.API_MAX_PAGE_SIZE + 1})
+    assert len(response.json()['items']) == settings.API_MAX_PAGE_SIZE
+
+
+def test_bulk_api_writes_products_with_per_item_results(staff_client, category, pizzaproduct, django_assert_max_num_queries):
+    def pizza(slug, **fields):
+        return dict(dict(
+            category=category.id, title=slug, slug=slug, image=pizzaproduct.image.name, description='Описание', price='10.00',
+            size='26см', board='Без борта', dough='Толстое', vegetarian=False
+        ), **fields)
+
+    items = [pizza(f'bulk-{i}') for i in range(20)] + [pizza('bad', category=999)]
+    with django_assert_max_num_queries(12):
+        response = staff_client.post('/api/pizza/bulk/', items, content_type='application/json')
+    results = response.json()['results']
+    assert [result['status'] for result in results[:20]] == ['created'] * 20
+    assert results[20]['errors']['category'] and results[20]['status'] == 'error'
+    response = staff_client.post('/api/pizza/bulk/', [pizza('bulk-0'), pizza('bulk-20')], content_type='application/json')
+    assert [result['status'] for result in response.json()['results']] == ['error', 'created']
+    category.refresh_from_db()
+    assert category.products_count == 22
+
+    beer_category = Category.objects.create(name='Пиво', slug='beer')
+    body = '\n'.join(json.dumps(item) for item in [
+        {'id': pizzaproduct.id, 'price': '7.50', 'category': beer_category.id}, {'id': 0, 'price': '1.00'}
+    ])
+    response = staff_client.post('/api/pizza/bulk/', body, content_type='application/x-ndjson')
+    assert [result['status'] for result in response.json()['results']] == ['updated', 'error']
+    pizzaproduct.refresh_from_db()
+    beer_category.refresh_from_db()
+    assert (pizzaproduct.price, beer_category.products_count) == (Decimal('7.50'), 1)
+    response = staff_client.post('/api/pizza/bulk/', [
+        pizza('escape', image='../pizza_shop/settings.py'), pizza('missing', image='missing.jpg')
+    ], content_type='application/json')
+    assert [result['errors']['image'] for result in response.json()['results']] == [
+        ['Недопустимый путь к изображению'], ['Изображение не найдено в хранилище']
+    ]
+
+
+def test_bulk_api_creates_orders_with_lines_and_events(staff_client, customer, cart, pizzaproduct, django_capture_on_commit_callbacks):
+    add_product(cart, pizzaproduct)
+    with django_capture_on_commit_callbacks() as callbacks:
+        response = staff_client.post('/api/orders/bulk/', [
+            {'customer': customer.pk, 'cart': cart.id, 'first_name': 'Имя', 'last_name': 'Фамилия', 'phone': '1', 'final_price': '1.00'}
+        ], content_type='application/json')
+    order = Order.objects.get(id=response.json()['results'][0]['id'])
+    assert order.final_price == Decimal('100.00')
+    assert list(order.lines.values_list('title', 'qty')) == [('Test pizza', 1)]
+    assert list(order.status_events.values_list('from_status', 'to_status')) == [(None, Order.STATUS_NEW)]
+    assert Cart.objects.get(id=cart.id).in_order
+    assert len(callbacks) == 1
+
+
+def test_order_api_creates_orders_from_cart(staff_client, customer, cart, pizzaproduct):
+    add_product(cart, pizzaproduct)
+    response = staff_client.post('/api/orders/', {
+        'customer': customer.pk, 'cart': cart.id, 'first_name': 'Имя', 'last_name': 'Фамилия', 'phone': '1'
+    }, content_type='application/json')
+    assert response.status_code == 201 and response.json()['final_price'] == '100.00'
+    order = Order.objects.get(id=response.json()['id'])
+    assert list(order.lines.values_list('title', 'qty', 'final_price')) == [('Test pizza', 1, Decimal('100.00'))]
+    assert Cart.objects.get(id=cart.id).in_order
+    customer.refresh_from_db()
+    assert (customer.orders_count, customer.lifetime_spend) == (1, Decimal('100.00'))
+
+
+def test_order_updates_apply_customer_total_deltas(staff_client, customer):
+    other = Customer.objects.create(user=User.objects.create(username='other-customer'), phone='2')
+    order = Order.objects.create(customer=customer, first_name='Имя', last_name='Фамилия', phone='1', final_price=Decimal('100.00'))
+    response = staff_client.patch(f'/api/orders/{order.id}/', {'final_price': '150.00'}, content_type='application/json')
+    assert response.status_code == 200
+    customer.refresh_from_db()
+    assert (customer.orders_count, customer.lifetime_spend) == (1, Decimal('150.00'))
+
+    response = staff_client.post('/api/orders/bulk/', [
+        {'id': order.id, 'customer': other.pk, 'final_price': '120.00'}
+    ], content_type='application/json')
+    assert response.json()['results'][0]['status'] == 'updated'
+    customer.refresh_from_db()
+    other.refresh_from_db()
+    assert (customer.orders_count, customer.lifetime_spend) == (0, Decimal('0.00'))
+    assert (other.orders_count, other.lifetime_spend) == (1, Decimal('150.00'))
+
+    assert Order.objects.filter(id=order.id).update(customer=customer, final_price=Decimal('90.00')) == 1
+    customer.refresh_from_db()
+    other.refresh_from_db()
+    assert (customer.orders_count, customer.lifetime_spend) == (1, Decimal('90.00'))
+    assert (other.orders_count, other.lifetime_spend) == (0, Decimal('0.00'))
+
+    Customer.objects.filter(user_id=customer.pk).update(orders_count=0, lifetime_spend=0)
+    Order.objects.create(customer=customer, first_name='Имя', last_name='Фамилия', phone='3', final_price=Decimal('10.00'))
+    order.delete()
+    customer.refresh_from_db()
+    assert (customer.orders_count, customer.lifetime_spend) == (1, Decimal('10.00'))
+
+
+def test_api_list_queries_do_not_grow_with_rows(staff_client, category, make_pizza):
+    def make_customer(i):
+        return Customer.objects.create(user=User.objects.create(username=f'api-user-{i}'), phone=str(i))
+
+    def make_order(i):
+        customer = make_customer(f'order-{i}')
+        return Order.objects.create(customer=customer, cart=Cart.objects.create(owner=customer), first_name='Имя', last_name='Фамилия', phone=str(i))
+
+    def make_cart_product(i):
+        cart = Cart.objects.create(owner=make_customer(f'line-{i}'))
+        return add_product(cart, make_pizza(f'line-pizza-{i}'))
+
+    factories = {
+        '/api/customers/': make_customer,
+        '/api/users/': lambda i: User.objects.create(username=f'plain-user-{i}'),
+        '/api/categories/': lambda i: Category.objects.create(name=f'Категория {i}', slug=f'category-{i}'),
+        '/api/pizza/': lambda i: make_pizza(f'api-pizza-{i}'),
+        '/api/orders/': make_order,
+        '/api/carts/': lambda i: Cart.objects.create(owner=make_customer(f'cart-{i}')),
+        '/api/cartproducts/': make_cart_product,
+    }
+
+    def count_queries(url):
+        cache.clear()
+        staff_client.login(username='admin', password='password')
+        with CaptureQueriesContext(connection) as context:
+            assert staff_client.get(url).status_code == 200
+        return len(context)
+
+    for url, factory in factories.items():
+        factory(0)
+        one_row_queries = count_queries(url)
+        for i in range(1, 5):
+            factory(i)
+        assert count_queries(url) == one_row_queries, url
+
+
+def test_catalog_api_answers_conditional_requests(staff_client, pizzaproduct, django_assert_num_queries, django_capture_on_commit_callbacks):
+    assert 'Last-Modified' not in staff_client.get('/api/pizza/')
+    cache.set('catalog:changed:pizzaproduct', int(timezone.now().timestamp()) - 5, None)
+    response = staff_client.get('/api/pizza/')
+    etag, last_modified = response['ETag'], response['Last-Modified']
+    with django_assert_num_queries(1):
+        response = staff_client.get('/api/pizza/', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304 and not response.content
+    assert staff_client.get('/api/pizza/', HTTP_IF_MODIFIED_SINCE=last_modified).status_code == 304
+    assert staff_client.get('/api/pizza/?page_size=1', HTTP_IF_NONE_MATCH=etag).status_code == 200
+    assert staff_client.get('/api/pizza/', HTTP_IF_NONE_MATCH='"stale"', HTTP_IF_MODIFIED_SINCE=last_modified).status_code == 200
+
+    detail = staff_client.get(f'/api/pizza/{pizzaproduct.id}/')
+    assert detail['Last-Modified'] == last_modified
+    with django_assert_num_queries(1):
+        assert staff_client.get(f'/api/pizza/{pizzaproduct.id}/', HTTP_IF_NONE_MATCH=detail['ETag']).status_code == 304
+
+    with django_capture_on_commit_callbacks(execute=True):
+        staff_client.post('/api/pizza/bulk/', [{'id': pizzaproduct.id, 'price': '5.00'}], content_type='application/json')
+    assert staff_client.get('/api/pizza/', HTTP_IF_NONE_MATCH=etag).status_code == 200
+    assert staff_client.get(f'/api/pizza/{pizzaproduct.id}/', HTTP_IF_NONE_MATCH=detail['ETag']).status_code == 200
+    assert staff_client.get('/api/pizza/', HTTP_IF_MODIFIED_SINCE=last_modified).status_code == 200
+    assert PizzaProduct.objects.get(id=pizzaproduct.id).updated_at > pizzaproduct.updated_at
+
+
+def test_fast_list_path_matches_serializers(staff_client, customer, pizzaproduct, make_pizza):
+    make_pizza('second-pizza')
+    Order.objects.create(customer=customer, first_name='Имя', last_name='Фамилия', phone='1', comment='Позвонить')
+    urls = ['/api/pizza/', '/api/pizza/?fields=id,title,image,price', '/api/orders/', '/api/categories/?fields=slug']
+    for url in urls:
+        fast_response = staff_client.get(url)
+        with mock.patch('mainapp.api.fast.get_value_converters', return_value=None):
+            serializer_response = staff_client.get(url)
+        assert json.loads(fast_response.content) == serializer_response.json(), url
+        assert not hasattr(fast_response, 'data')
+    assert list(staff_client.get('/api/pizza/?fields=id,title').json()['items'][0]) == ['id', 'title']
+
+
+def test_export_streams_lines_with_batched_products(staff_client, cart, make_pizza, django_assert_max_num_queries):
+    for i in range(5):
+        add_product(cart, make_pizza(f'export-pizza-{i}'))
+    with django_assert_max_num_queries(6):
+        response = staff_client.get('/api/export/lines/')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+    assert [line['product_slug'] for line in lines] == [f'export-pizza-{i}' for i in range(5)]
+    assert lines[0]['product_type'] == 'pizzaproduct' and lines[0]['final_price'] == '100.00'
+
+    response = staff_client.get('/api/export/carts/', {'output': 'csv'})
+    rows = b''.join(response.streaming_content).decode().splitlines()
+    assert rows[0] == 'id,owner_id,total_products,final_price,in_order,for_anonymous_user'
+    assert rows[1] == f'{cart.id},{cart.owner_id},5,500.00,False,False'
+    assert staff_client.get('/api/export/carts/', {'output': 'xml'}).status_code == 400
+
+
+def test_catalog_api_responses_are_cached_per_scope(staff_client, pizzaproduct, django_capture_on_commit_callbacks):
+    def get_catalog_queries(url):
+        with CaptureQueriesContext(connection) as context:
+            response = staff_client.get(url)
+        return response, [query['sql'] for query in context.captured_queries if 'mainapp_' in query['sql']]
+
+    first, _ = get_catalog_queries('/api/pizza/?fields=id,price')
+    cached, catalog_queries = get_catalog_queries('/api/pizza/?fields=id,price')
+    assert catalog_queries == [] and cached.content == first.content
+    assert get_catalog_queries('/api/pizza/?fields=id,title')[1]
+    with django_capture_on_commit_callbacks(execute=True):
+        Category.objects.create(name='Пиво', slug='beer')
+    assert get_catalog_queries('/api/pizza/?fields=id,price')[1] == []
+    with django_capture_on_commit_callbacks(execute=True):
+        PizzaProduct.objects.filter(id=pizzaproduct.id).update(price=Decimal('1.00'))
+        pizzaproduct.save()
+    response, catalog_queries = get_catalog_queries('/api/pizza/?fields=id,price')
+    assert catalog_queries and response.json()['items'][0]['price'] == '100.00'
+    assert staff_client.get('/api/pizza/0/').status_code == 404
+
+
+def test_cached_api_responses_keep_headers_and_audience(staff_client, logged_client, pizzaproduct):
+    first = staff_client.get('/api/pizza/')
+    with CaptureQueriesContext(connection) as context:
+        cached = staff_client.get('/api/pizza/')
+    assert not [query for query in context.captured_queries if 'mainapp_' in query['sql']]
+    assert cached['Vary'] == first['Vary'] and cached['Allow'] == first['Allow']
+    with CaptureQueriesContext(connection) as context:
+        assert logged_client.get('/api/pizza/').status_code == 200
+    assert [query for query in context.captured_queries if 'mainapp_pizzaproduct' in query['sql']]
+    assert Client().get('/api/pizza/').status_code == 403
+
+
+def test_stale_catalog_response_gets_no_fresh_validators(staff_client, category):
+    first = staff_client.get('/api/categories/')
+    bump_versions('category')
+    with mock.patch.object(cache, 'add', return_value=False):
+        stale = staff_client.get('/api/categories/')
+    assert stale.status_code == 200 and stale.content == first.content
+    assert not stale.has_header('ETag') and not stale.has_header('Last-Modified')
+    fresh = staff_client.get('/api/categories/')
+    assert fresh.has_header('ETag') and fresh['ETag'] != first['ETag']
+
+
+def test_local_memory_cache_is_refused_for_several_workers():
+    check_shared_cache()
+    with override_settings(WEB_CONCURRENCY=2), pytest.raises(ImproperlyConfigured):
+        check_shared_cache()
+
+
+def test_get_cached_serves_stale_value_while_rebuild_is_locked():
+    builder = mock.Mock(return_value='fresh')
+    assert get_cached('stampede', ['pizzaproduct'], builder) == 'fresh'
+    bump_versions('pizzaproduct')
+    version, = get_versions('pizzaproduct')
+    cache.add(f'stampede:{version}:lock', 1)
+    assert get_cached('stampede', ['pizzaproduct'], builder) == 'fresh'
+    assert builder.call_count == 1
+    cache.delete('stampede:stale')
+    with mock.patch('mainapp.caching.LOCK_WAIT', 0.1):
+        builder.return_value = 'rebuilt'
+        assert get_cached('stampede', ['pizzaproduct'], builder) == 'rebuilt'
+    assert builder.call_count == 2
+
+
+def test_storefront_bootstrap_returns_cached_catalog_and_cart(client, pizzaproduct, logged_client, cart, django_assert_num_queries):
+    client.get('/add-to-cart/pizzaproduct/test-slug/')
+    data = client.get('/api/bootstrap/').json()
+    assert data['categories'] == [{'name': 'Пицца', 'url': '/category/pizza/', 'count': 1}]
+    assert [product['slug'] for product in data['products']] == ['test-slug']
+    assert data['cart'] == {'id': None, 'total_products': 1, 'final_price': '100.00'}
+
+    add_product(cart, pizzaproduct)
+    logged_client.get('/api/bootstrap/')
+    with django_assert_num_queries(2):
+        data = logged_client.get('/api/bootstrap/').json()
+    assert data['cart'] == {'id': cart.id, 'total_products': 1, 'final_price': '100.00'}
+    assert data['products'][0]['price'] == '100.00'
+
+
+def test_make_order_snapshots_lines_in_one_insert(logged_client, cart, make_pizza):
+    pizza = make_pizza('ordered-pizza')
+    add_product(cart, pizza)
+    change_qty(cart, pizza, 2)
+    form = {
+        'first_name': 'Имя', 'last_name': 'Фамилия', 'phone': '123', 'address': 'Адрес',
+        'buying_type': Order.BUYING_TYPE_SELF, 'order_date': (timezone.localdate() + timedelta(days=1)).isoformat(), 'comment': ''
+    }
+    with CaptureQueriesContext(connection) as context:
+        logged_client.post('/makeorder/', form)
+    writes = [re.match(r'(INSERT INTO|UPDATE) (\S+)', query['sql']).group(0) for query in context.captured_queries
+              if query['sql'].startswith(('INSERT', 'UPDATE'))]
+    assert writes == [
+        'INSERT INTO "mainapp_deliveryslot"', 'UPDATE "mainapp_deliveryslot"', 'INSERT INTO "mainapp_order"', 'UPDATE "mainapp_customer"', 'INSERT INTO "mainapp_orderstatusevent"',
+        'INSERT INTO "mainapp_orderline"', 'UPDATE "mainapp_cart"'
+    ]
+    order = Order.objects.get(cart=cart)
+    assert order.final_price == Decimal('200.00')
+    PizzaProduct.objects.filter(id=pizza.id).update(title='Переименована', price=Decimal('1.00'))
+    line, = order.lines.all()
+    assert (line.product_type, line.product_id, line.title, line.unit_price, line.qty, line.final_price) == (
+        'pizzaproduct', pizza.id, 'ordered-pizza', Decimal('100.00'), 2, Decimal('200.00')
+    )
+    with CaptureQueriesContext(connection) as context:
+        response = logged_client.get('/profile/')
+    assert 'ordered-pizza x 2' in response.content.decode()
+    assert not [query for query in context.captured_queries if re.search('pizzaproduct|cartproduct', query['sql'])]
+
+
+def test_profile_order_history_is_keyset_paginated(logged_client, customer, django_capture_on_commit_callbacks):
+    for i in range(12):
+        Order.objects.create(customer=customer, first_name='Имя', last_name='Фамилия', phone=str(i), final_price=Decimal('10.00'))
+    customer.refresh_from_db()
+    assert (customer.orders_count, customer.lifetime_spend) == (12, Decimal('120.00'))
+
+    with CaptureQueriesContext(connection) as first_page_context:
+        response = logged_client.get('/profile/')
+    first_page = response.context['orders']
+    assert [order.phone for order in first_page] == [str(i) for i in range(11, 1, -1)]
+    with CaptureQueriesContext(connection) as last_page_context:
+        response = logged_client.get('/profile/', {'after': response.context['next_cursor']})
+    assert [order.phone for order in response.context['orders']] == ['1', '0']
+    assert response.context['next_cursor'] is None
+    assert len(first_page_context) == len(last_page_context)
+    assert not any('COUNT(' in query['sql'] for query in first_page_context.captured_queries)
+
+    Order.objects.filter(phone='0').delete()
+    customer.refresh_from_db()
+    assert (customer.orders_count, customer.lifetime_spend) == (11, Decimal('110.00'))
+
+
+def test_kitchen_board_streams_order_events_without_queries(staff_client, customer, django_capture_on_commit_callbacks, django_assert_num_queries):
+    assert Client().get('/kitchen/events/').status_code == 302
+    response = staff_client.get('/kitchen/events/')
+    assert response['Content-Type'] == 'text/event-stream'
+    stream = iter(response.streaming_content)
+    assert next(stream) == b'retry: 1000\n\n'
+    with django_capture_on_commit_callbacks(execute=True):
+        order = Order.objects.create(customer=customer, first_name='Имя', last_name='Фамилия', phone='1')
+    with django_capture_on_commit_callbacks(execute=True):
+        order.comment = 'Без лука'
+        order.save()
+        order.status = Order.STATUS_IN_PROGRESS
+        order.save()
+    with django_assert_num_queries(0):
+        events = [json.loads(next(stream).decode().split('data: ')[1]) for _ in range(2)]
+    assert [(event['type'], event['order_id'], event['status']) for event in events] == [
+        ('created', order.id, Order.STATUS_NEW), ('status_changed', order.id, Order.STATUS_IN_PROGRESS)
+    ]
+    with mock.patch('django.http.response.signals.request_finished.send'):
+        response.close()
+    assert not order_events.subscriptions
+    assert 'Заказы на кухне' in staff_client.get('/kitchen/').content.decode()
+
+
+def test_event_hubs_share_events_through_spool(tmp_path):
+    spool_path = str(tmp_path / 'events.ndjson')
+    kitchen, checkout = EventHub(spool_path), EventHub(spool_path)
+    with kitchen.subscribe() as subscription:
+        checkout.publish({'type': 'created', 'order_id': 1})
+        assert subscription.get(timeout=1) == {'type': 'created', 'order_id': 1}
+        kitchen.publish({'type': 'status_changed', 'order_id': 1})
+        assert subscription.get(timeout=1) == {'type': 'status_changed', 'order_id': 1}
+        assert subscription.get(timeout=0.3) is None
+
+
+@override_settings(ORDER_SLOT_CAPACITY=1, ORDER_SLOT_DAY_START='11:00', ORDER_SLOT_DAY_END='13:00')
+def test_asap_orders_take_the_earliest_free_slot(db):
+    day = timezone.localdate() + timedelta(days=1)
+    first = reserve_earliest_slot(day)
+    second = reserve_earliest_slot(day)
+    assert [DeliverySlot.objects.get(id=slot_id).start_time for slot_id in (first, second)] == [time(11), time(12)]
+    with pytest.raises(SlotUnavailable):
+        reserve_earliest_slot(day)
+    far_day = timezone.localdate() + timedelta(days=settings.ORDER_SLOT_MAX_DAYS + 1)
+    with pytest.raises(SlotUnavailable):
+        reserve_slot(far_day, time(11))
+    assert not DeliverySlot.objects.filter(date=far_day).exists()
+
+
+def test_online_payment_reserves_slot_and_slot_stays_read_only(logged_client, staff_client, cart, make_pizza):
+    yesterday = timezone.localdate() - timedelta(days=1)
+    with pytest.raises(SlotPassed):
+        reserve_slot(yesterday, time(11))
+    day = timezone.localdate() + timedelta(days=2)
+    add_product(cart, make_pizza('payed-pizza'))
+    response = logged_client.post('/payed-online-order/', {'order_date': yesterday.isoformat(), 'slot_start': '11:00'})
+    assert response.json() == {'status': 'payed', 'slot_error': 'Выбранное время уже прошло, выберите другое'}
+    order = Order.objects.get(cart=cart)
+    assert order.slot_id is None and order.status == Order.STATUS_PAYED
+    order.delete()
+
+    Cart.objects.filter(id=cart.id).update(in_order=False)
+    response = logged_client.post('/payed-online-order/', {'order_date': day.isoformat(), 'slot_start': '12:00'})
+    assert response.json() == {'status': 'payed'}
+    order = Order.objects.get(cart=cart)
+    slot = DeliverySlot.objects.get(date=day, start_time=time(12))
+    assert order.slot_id == slot.id and slot.available == slot.capacity - 1
+
+    other_slot_id = reserve_slot(day, time(13))
+    response = staff_client.patch(f'/api/orders/{order.id}/', {'slot': other_slot_id}, content_type='application/json')
+    assert response.status_code == 200 and Order.objects.get(id=order.id).slot_id == slot.id
+    assert 'name="slot"' not in staff_client.get(f'/admin/mainapp/order/{order.id}/change/').content.decode()
+
+
+def test_event_spool_is_rotated_and_tail_thread_stops(tmp_path):
+    spool_path = str(tmp_path / 'events.ndjson')
+    kitchen, checkout = EventHub(spool_path), EventHub(spool_path, spool_max_bytes=200)
+    with kitchen.subscribe() as subscription:
+        tail_thread = kitchen.tail_thread
+        for order_id in range(5):
+            checkout.publish({'type': 'created', 'order_id': order_id})
+        assert [subscription.get(timeout=1)['order_id'] for _ in range(5)] == list(range(5))
+        assert os.path.exists(spool_path + '.1') and os.path.getsize(spool_path) < 200
+    tail_thread.join(timeout=1)
+    assert not tail_thread.is_alive() and kitchen.tail_thread is None
+
+
+def test_event_stream_is_closed_after_max_duration():
+    hub = EventHub()
+    stream = ServerSentEventStream(hub.subscribe(), heartbeat_interval=0.1, max_seconds=0.25)
+    assert list(stream)[0] == 'retry: 1000\n\n'
+    assert not hub.subscriptions
+
+
+def test_order_events_need_spool_for_several_workers(tmp_path):
+    check_events_spool()
+    with override_settings(WEB_CONCURRENCY=2):
+        with pytest.raises(ImproperlyConfigured):
+            check_events_spool()
+        with mock.patch.object(order_events, 'spool_path', str(tmp_path / 'events.ndjson')):
+            check_events_spool()
+
+
+def test_queryset_status_update_records_and_publishes_events(customer, django_capture_on_commit_callbacks):
+    order = Order.objects.create(customer=customer, first_name='Имя', last_name='Фамилия', phone='1')
+    with django_capture_on_commit_callbacks() as callbacks:
+        assert Order.objects.filter(id=order.id).update(status=Order.STATUS_IN_PROGRESS, comment='Срочно') == 1
+    assert len(callbacks) == 1
+    order.refresh_from_db()
+    assert (order.status, order.comment) == (Order.STATUS_IN_PROGRESS, 'Срочно')
+    assert list(order.status_events.values_list('from_status', 'to_status')) == [
+        (None, Order.STATUS_NEW), (Order.STATUS_NEW, Order.STATUS_IN_PROGRESS)
+    ]
+
+
+def test_bulk_transition_updates_matching_orders_in_one_update(customer, django_capture_on_commit_callbacks):
+    orders = [
+        Order.objects.create(customer=customer, first_name='Имя', last_name='Фамилия', phone=str(i), status=Order.STATUS_IN_PROGRESS)
+        for i in range(3)
+    ]
+    transition(orders[2], Order.STATUS_READY)
+    with pytest.raises(TransitionError):
+        bulk_transition(Order.objects.all(), Order.STATUS_IN_PROGRESS, Order.STATUS_COMPLETED)
+
+    with CaptureQueriesContext(connection) as context, django_capture_on_commit_callbacks() as callbacks:
+        changed = bulk_transition(Order.objects.all(), Order.STATUS_IN_PROGRESS, Order.STATUS_READY)
+    assert [order.id for order in changed] == [orders[0].id, orders[1].id]
+    assert len([query for query in context.captured_queries if query['sql'].startswith('UPDATE')]) == 1
+    assert len(callbacks) == 2
+    assert set(Order.objects.values_list('status', flat=True)) == {Order.STATUS_READY}
+    assert list(orders[0].status_events.values_list('from_status', 'to_status')) == [
+        (None, Order.STATUS_IN_PROGRESS), (Order.STATUS_IN_PROGRESS, Order.STATUS_READY)
+    ]
+
+
+def test_queryset_status_update_refuses_illegal_transitions(customer, django_capture_on_commit_callbacks):
+    order = Order.objects.create(customer=customer, first_name='Имя', last_name='Фамилия', phone='1', status=Order.STATUS_COMPLETED)
+    with django_capture_on_commit_callbacks() as callbacks, pytest.raises(TransitionError):
+        Order.objects.filter(id=order.id).update(status=Order.STATUS_NEW)
+    assert not callbacks
+    assert Order.objects.get(id=order.id).status == Order.STATUS_COMPLETED
+    assert order.status_events.count() == 1
+
+
+def test_stage_durations_keep_the_first_transition_after_since(customer):
+    order = Order.objects.create(customer=customer, first_name='Имя', last_name='Фамилия', phone='1')
+    OrderStatusEvent.objects.update(created_at=F('created_at') - timedelta(hours=2))
+    transition(order, Order.STATUS_IN_PROGRESS)
+    durations = get_stage_durations(since=timezone.now() - timedelta(hours=1))
+    assert list(durations) == [Order.STATUS_NEW] and durations[Order.STATUS_NEW][0] >= 2 * 60 * 60
+    assert not get_stage_durations(since=timezone.now() + timedelta(hours=1))
+
+
+def test_order_status_changes_are_validated_and_logged(staff_client, customer):
+    order = Order.objects.create(customer=customer, first_name='Имя', last_name='Фамилия', phone='1')
+    order = Order.objects.get(id=order.id)
+    order.status = Order.STATUS_COMPLETED
+    with pytest.raises(ValidationError):
+        order.clean()
+    order.status = Order.STATUS_IN_PROGRESS
+    order.save()
+    OrderStatusEvent.objects.update(created_at=F('created_at') - timedelta(seconds=30))
+
+    response = staff_client.post('/admin/mainapp/order/', {'action': 'transition_to_is_ready', '_selected_action': [order.id]})
+    assert response.status_code == 302
+    assert Order.objects.get(id=order.id).status == Order.STATUS_READY
+    latencies = get_stage_latencies()
+    assert latencies[Order.STATUS_IN_PROGRESS]['count'] == 1
+    assert 30 <= latencies[Order.STATUS_IN_PROGRESS]['p50'] < 40
+
+
+def test_order_api_rejects_illegal_status_transitions(staff_client, customer):
+    order = Order.objects.create(customer=customer, first_name='Имя', last_name='Фамилия', phone='1', status=Order.STATUS_COMPLETED)
+    response = staff_client.patch(f'/api/orders/{order.id}/', {'status': Order.STATUS_NEW}, content_type='application/json')
+    assert response.status_code == 400 and 'status' in response.json()
+    response = staff_client.post('/api/orders/bulk/', [{'id': order.id, 'status': Order.STATUS_NEW}], content_type='application/json')
+    assert response.json()['results'][0]['status'] == 'error'
+    assert Order.objects.get(id=order.id).status == Order.STATUS_COMPLETED
+    assert order.status_events.count() == 1
+
+    order = Order.objects.create(customer=customer, first_name='Имя', last_name='Фамилия', phone='2')
+    response = staff_client.patch(f'/api/orders/{order.id}/', {'status': Order.STATUS_IN_PROGRESS}, content_type='application/json')
+    assert response.status_code == 200
+    assert list(order.status_events.values_list('from_status', 'to_status')) == [
+        (None, Order.STATUS_NEW), (Order.STATUS_NEW, Order.STATUS_IN_PROGRESS)
+    ]
+
+
+@override_settings(ORDER_SLOT_CAPACITY=2)
+def test_delivery_slots_are_reserved_from_counters(logged_client, cart, make_pizza, django_assert_num_queries):
+    day = timezone.localdate() + timedelta(days=3)
+    with django_assert_num_queries(1):
+        response = Client().get('/api/slots/', {'from': day.isoformat(), 'to': day.isoformat()})
+    assert response.json()[0] == {'date': day.isoformat(), 'start_time': '11:00:00', 'end_time': '12:00:00', 'available': 2}
+
+    slot_id = reserve_slot(day, time(11))
+    with django_assert_num_queries(2):
+        assert reserve_slot(day, time(11)) == slot_id
+    with pytest.raises(SlotUnavailable):
+        reserve_slot(day, time(11))
+    DeliverySlot.objects.filter(id=slot_id).update(available=1)
+
+    add_product(cart, make_pizza('slot-pizza'))
+    form = {
+        'first_name': 'Имя', 'last_name': 'Фамилия', 'phone': '123', 'address': 'Адрес', 'slot_start': '11:00',
+        'buying_type': Order.BUYING_TYPE_SELF, 'order_date': day.isoformat(), 'comment': ''
+    }
+    assert logged_client.post('/makeorder/', form).url == '/'
+    order = Order.objects.get(cart=cart)
+    assert order.slot_id == slot_id
+    assert logged_client.post('/makeorder/', form).url == '/checkout/'
+    slots = logged_client.get('/api/slots/', {'from': day.isoformat(), 'to': day.isoformat()}).json()
+    assert [slot['available'] for slot in slots[:2]] == [0, 2]
+    order.delete()
+    assert DeliverySlot.objects.get(id=slot_id).available == 1
+    assert logged_client.get('/api/slots/', {'from': day.isoformat(), 'to': (day + timedelta(days=30)).isoformat()}).status_code == 400
@@ -17,7 +17,9 @@ from .views import (
     PizzaAddView,
     BeerAddView,
     ProductUpgradeView,
-    SearchResultsView
+    SearchResultsView,
+    KitchenBoardView,
+    KitchenEventsView
 )
 
 urlpatterns = [
@@ -39,6 +41,8 @@ urlpatterns = [
     path('beer_add/', BeerAddView.as_view(), name='beer_add'),
     path('upgrade/<str:ct_model>/<str:slug>/',ProductUpgradeView.as_view(), name='upgrade'),
     path('search/', SearchResultsView.as_view(), name='search_results'),
+    path('kitchen/', KitchenBoardView.as_view(), name='kitchen_board'),
+    path('kitchen/events/', KitchenEventsView.as_view(), name='kitchen_events'),
 ]
 
 
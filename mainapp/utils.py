@@ -1,11 +1,45 @@
 from django.db import models
+from django.db.models import prefetch_related_objects
+from django.db.models.functions import Coalesce
 from .custom_logging import logger
 def recalc_cart(cart):
     logger.info('Использование функции recalc_cart')
-    cart_data =  cart.products.aggregate(models.Sum('final_price'), models.Count('id'))
+    cart_data =  cart.related_products.aggregate(models.Sum('final_price'), models.Count('id'))
     if cart_data.get('final_price__sum'):
         cart.final_price =  cart_data.get('final_price__sum')
     else:
         cart.final_price = 0
     cart.total_products = cart_data['id__count']
-    cart.save()
\ No newline at end of file
+    cart.save()
+
+
+def update_cart_totals(cart, products_delta=0, price_delta=0):
+    logger.debug('Инкрементальное обновление итогов корзины')
+    updated = cart.__class__.objects.filter(id=cart.id, total_products__gte=-products_delta).update(
+        total_products=models.F('total_products') + products_delta,
+        final_price=models.F('final_price') + price_delta
+    )
+    if not updated:
+        logger.warning(f'Итоги корзины {cart.id} разошлись с товарами, выполняется полный пересчёт')
+        recalc_cart(cart)
+        return
+    cart.total_products += products_delta
+    cart.final_price += price_delta
+
+
+def get_carts_with_wrong_totals(queryset):
+    logger.info('Сверка итогов корзин с полным пересчётом')
+    queryset = queryset.annotate(
+        lines_count=models.Count('related_products'),
+        lines_sum=Coalesce(models.Sum('related_products__final_price'), models.Value(0), output_field=models.DecimalField())
+    )
+    return queryset.filter(
+        ~models.Q(total_products=models.F('lines_count')) | ~models.Q(final_price=models.F('lines_sum'))
+    ).order_by('id')
+
+
+def prefetch_content_objects(cart_products):
+    logger.debug('Пакетная загрузка товаров для позиций корзины')
+    cart_products = list(cart_products)
+    prefetch_related_objects(cart_products, 'content_object')
+    return cart_products
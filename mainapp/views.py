@@ -4,16 +4,23 @@ from django.contrib.auth import authenticate, login
 from django.contrib.auth.models import User
 from django.db import transaction 
 from django.shortcuts import render
-from django.contrib.contenttypes.models import ContentType
 from django.contrib import messages
 from django.views.generic import DetailView, View
-from django.http import HttpResponseRedirect, JsonResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_date, parse_time
+from django.utils.decorators import method_decorator
 from django.views.generic import ListView
 
-from .models import PizzaProduct, BeerProduct, Category, LatestProducts, Customer, Cart, CartProduct, Order
+from .models import PizzaProduct, BeerProduct, Category, LatestProducts, Customer, Cart, Order
 from .mixins import CategoryDetailMixin, CartMixin
+from .registry import product_registry
 from .forms import OrderForm, LoginForm, RegistrationForm, PizzaAddForm, BeerAddForm
-from .utils import recalc_cart
+from .cart import add_product, remove_product, change_qty, get_cart_items
+from .search import product_search
+from .orders import place_order, get_order_history_page
+from .events import order_events, ServerSentEventStream
+from .slots import SlotUnavailable, SlotPassed
 
 from .custom_logging import logger
 
@@ -41,15 +48,10 @@ class BaseView(CartMixin, View):
 
 class ProductDetailView(CartMixin, CategoryDetailMixin, DetailView):
 
-    CT_MODEL_MODEL_CLASS = {
-        'pizzaproduct': PizzaProduct,
-        'beerproduct': BeerProduct
-    }
-
     def dispatch(self, request, *args, **kwargs):
         user = request.user
         logger.info(f'Использование ProductDetailView пользоватлем {user}')
-        self.model = self.CT_MODEL_MODEL_CLASS[kwargs['ct_model']] 
+        self.model = product_registry.get_model(kwargs['ct_model'])
         self.queryset = self.model._base_manager.all()
         return super().dispatch(request, *args, **kwargs)
 
@@ -87,21 +89,11 @@ class AddToCartView(CartMixin, View):
     def get(self, request, *args, **kwargs):
         user = request.user
         logger.info(f'Использование AddToCartView пользоватлем {user}')
-        if request.user.is_authenticated:
-            ct_model, product_slug = kwargs.get('ct_model'), kwargs.get('slug')
-            content_type = ContentType.objects.get(model=ct_model)
-            product = content_type.model_class().objects.get(slug=product_slug)
-            cart_product, created = CartProduct.objects.get_or_create(
-                user=self.cart.owner, cart=self.cart, content_type=content_type, object_id=product.id
-            )
-            if created:
-                self.cart.products.add(cart_product)
-            recalc_cart(self.cart)
-            messages.add_message(request, messages.INFO, "Товар успешно добавлен")
-            return HttpResponseRedirect('/cart/')
-        else:
-            logger.warning('Пользователь не автоизован')
-            return HttpResponseRedirect('/login/')
+        ct_model, product_slug = kwargs.get('ct_model'), kwargs.get('slug')
+        product = product_registry.get_model(ct_model).objects.get(slug=product_slug)
+        add_product(self.cart, product)
+        messages.add_message(request, messages.INFO, "Товар успешно добавлен")
+        return HttpResponseRedirect('/cart/')
 
 class DeleteFromCartView(CartMixin, View):
 
@@ -109,14 +101,8 @@ class DeleteFromCartView(CartMixin, View):
         user = request.user
         logger.info(f'Использование DeleteFromCartView пользоватлем {user}')
         ct_model, product_slug = kwargs.get('ct_model'), kwargs.get('slug')
-        content_type = ContentType.objects.get(model=ct_model)
-        product = content_type.model_class().objects.get(slug=product_slug)
-        cart_product = CartProduct.objects.get(
-            user=self.cart.owner, cart=self.cart, content_type=content_type, object_id=product.id
-        )
-        self.cart.products.remove(cart_product)
-        cart_product.delete()
-        recalc_cart(self.cart)
+        product = product_registry.get_model(ct_model).objects.get(slug=product_slug)
+        remove_product(self.cart, product)
         messages.add_message(request, messages.INFO, "Товар успешно удален")
         return HttpResponseRedirect('/cart/')
 
@@ -126,15 +112,9 @@ class ChangeQTYView(CartMixin, View):
         user = request.user
         logger.info(f'Использование ChangeQTYView пользоватлем {user}')
         ct_model, product_slug = kwargs.get('ct_model'), kwargs.get('slug')
-        content_type = ContentType.objects.get(model=ct_model)
-        product = content_type.model_class().objects.get(slug=product_slug)
-        cart_product = CartProduct.objects.get(
-            user=self.cart.owner, cart=self.cart, content_type=content_type, object_id=product.id
-        )
+        product = product_registry.get_model(ct_model).objects.get(slug=product_slug)
         qty = int(request.POST.get('qty'))
-        cart_product.qty = qty
-        cart_product.save()
-        recalc_cart(self.cart)
+        change_qty(self.cart, product, qty)
         messages.add_message(request, messages.INFO, "Кол-во успешно изменено")
         return HttpResponseRedirect('/cart/')
 
@@ -146,6 +126,7 @@ class CartView(CartMixin, View):
         categories = Category.objects.get_categories_for_left_sidebar()
         context = {
             'cart': self.cart,
+            'cart_items': get_cart_items(self.cart),
             'categories': categories
         }
         return render(request, 'cart.html', context)
@@ -168,6 +149,7 @@ class CheckoutView(CartMixin, View):
         form = OrderForm(request.POST or None)
         context = {
             'cart': self.cart,
+            'cart_items': get_cart_items(self.cart),
             'categories': categories,
             'form': form,
             'client_secret' : intent.client_secret
@@ -175,6 +157,12 @@ class CheckoutView(CartMixin, View):
         return render(request, 'checkout.html', context)
 
 
+def get_slot_error_message(exc):
+    if isinstance(exc, SlotPassed):
+        return "Выбранное время уже прошло, выберите другое"
+    return "Выбранное время уже занято, выберите другое"
+
+
 class MakeOrderView(CartMixin, View):
 
     @transaction.atomic
@@ -186,18 +174,11 @@ class MakeOrderView(CartMixin, View):
         if form.is_valid():
             new_order = form.save(commit=False)
             new_order.customer = customer
-            new_order.first_name = form.cleaned_data['first_name']
-            new_order.last_name = form.cleaned_data['last_name']
-            new_order.phone = form.cleaned_data['phone']
-            new_order.address = form.cleaned_data['address']
-            new_order.buying_type = form.cleaned_data['buying_type']
-            new_order.order_date = form.cleaned_data['order_date']
-            new_order.comment = form.cleaned_data['comment']
-            new_order.save()
-            self.cart.in_order = True
-            self.cart.save()
-            new_order.cart = self.cart
-            new_order.save()
+            try:
+                place_order(new_order, self.cart, form.cleaned_data['slot_start'])
+            except SlotUnavailable as exc:
+                messages.add_message(request, messages.ERROR, get_slot_error_message(exc))
+                return HttpResponseRedirect('/checkout/')
             messages.add_message(request, messages.INFO, "Спасибо за заказ! Мы с вами свяжемся!")
             return HttpResponseRedirect('/')
         logger.error('Форма заказа не валидна')
@@ -210,7 +191,7 @@ class PayedOnlineOrderView(CartMixin, View):
     def post(self, request, *args, **kwargs):
         user = request.user
         logger.info(f'Использование PayedOnlineOrderView пользоватлем {user}')
-        customer = Customer.objects.get(user=request.user)
+        customer = Customer.objects.select_related('user').get(user=request.user)
         new_order = Order()
         new_order.customer = customer
         new_order.first_name = customer.user.first_name
@@ -218,12 +199,18 @@ class PayedOnlineOrderView(CartMixin, View):
         new_order.phone = customer.phone
         new_order.address = customer.address
         new_order.buying_type = Order.BUYING_TYPE_SELF
-        new_order.save()
-        self.cart.in_order = True
-        self.cart.save()
-        new_order.cart = self.cart
         new_order.status = Order.STATUS_PAYED
-        new_order.save()
+        try:
+            new_order.order_date = parse_date(request.POST.get('order_date') or '') or new_order.order_date
+            slot_start = parse_time(request.POST.get('slot_start') or '')
+        except ValueError:
+            slot_start = None
+        try:
+            place_order(new_order, self.cart, slot_start)
+        except SlotUnavailable as exc:
+            logger.warning(f'Оплаченный заказ оформлен без слота: {exc}')
+            place_order(new_order, self.cart, with_slot=False)
+            return JsonResponse({"status": "payed", "slot_error": get_slot_error_message(exc)})
         return JsonResponse({"status": "payed"})
 
 
@@ -293,12 +280,15 @@ class ProfileView(CartMixin, View):
         user = request.user
         logger.info(f'Использование ProfileView пользоватлем {user}')
         customer = Customer.objects.get(user=request.user)
-        orders = Order.objects.filter(customer=customer).order_by('-created_at')
+        orders, next_cursor = get_order_history_page(customer, request.GET.get('after'))
         categories = Category.objects.get_categories_for_left_sidebar()
         return render(
             request,
             'profile.html',
-            {'orders':orders,'cart':self.cart, 'categories': categories}
+            {
+                'orders': orders, 'next_cursor': next_cursor, 'is_first_page': 'after' not in request.GET,
+                'customer': customer, 'cart': self.cart, 'categories': categories
+            }
         )
 
 
@@ -417,8 +407,7 @@ class ProductUpgradeView(CartMixin, View):
     def get(self, request, *args, **kwargs):
         logger.info(f'Использование ProductUpgradeView')
         ct_model, product_slug = kwargs.get('ct_model'), kwargs.get('slug')
-        content_type = ContentType.objects.get(model=ct_model)
-        product = content_type.model_class().objects.get(slug=product_slug)
+        product = product_registry.get_model(ct_model).objects.get(slug=product_slug)
         if product.category.name == 'Пиво':
             form = BeerAddForm(instance=product)
         else:
@@ -429,8 +418,7 @@ class ProductUpgradeView(CartMixin, View):
 
     def post(self, request, *args, **kwargs):
         ct_model, product_slug = kwargs.get('ct_model'), kwargs.get('slug')
-        content_type = ContentType.objects.get(model=ct_model)
-        product = content_type.model_class().objects.get(slug=product_slug)
+        product = product_registry.get_model(ct_model).objects.get(slug=product_slug)
         if product.category.name == 'Пиво':
             form = BeerAddForm(request.POST, request.FILES, instance=product)
             if form.is_valid():
@@ -492,9 +480,33 @@ class SearchResultsView(ListView):
  
     def get_queryset(self): 
         query = self.request.GET.get('q')
-        object_list = []
-        beerproducts = BeerProduct.objects.filter(title__icontains=query)
-        pizzaproducts = PizzaProduct.objects.filter(title__icontains=query)
-        object_list.extend(beerproducts)
-        object_list.extend(pizzaproducts)
-        return object_list
\ No newline at end of file
+        if not query:
+            return []
+        return product_search.search(query)
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class KitchenBoardView(CartMixin, View):
+
+    def get(self, request, *args, **kwargs):
+        logger.info(f'Открытие доски кухни пользователем {request.user}')
+        orders = Order.objects.exclude(status=Order.STATUS_COMPLETED).order_by('created_at', 'id')
+        categories = Category.objects.get_categories_for_left_sidebar()
+        return render(
+            request,
+            'kitchen_board.html',
+            {'orders': orders, 'completed_status': Order.STATUS_COMPLETED, 'cart': self.cart, 'categories': categories}
+        )
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class KitchenEventsView(View):
+
+    def get(self, request, *args, **kwargs):
+        logger.info(f'Подписка на события заказов пользователем {request.user}')
+        response = StreamingHttpResponse(
+            ServerSentEventStream(order_events.subscribe()), content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
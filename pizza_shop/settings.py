@@ -45,10 +45,48 @@ INSTALLED_APPS = [
     'rest_framework'
 ]
 
-# REST_FRAMEWORK = {
-#     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-#     'PAGE_SIZE': 2
-# }
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'mainapp.api.pagination.KeysetPagination',
+    'PAGE_SIZE': 20
+}
+
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+
+CACHE_LOCATION = os.environ.get('CACHE_LOCATION')
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.memcached.PyMemcacheCache'),
+        'LOCATION': CACHE_LOCATION,
+    } if CACHE_LOCATION else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+
+API_MAX_PAGE_SIZE = 100
+
+API_BULK_CHUNK_SIZE = 500
+
+# Each kitchen event stream holds a worker for up to KITCHEN_STREAM_MAX_SECONDS,
+# then the browser reconnects. Serve /kitchen/events/ from ASGI or gevent workers.
+# With several workers ORDER_EVENTS_SPOOL must point to a file shared by all of them.
+ORDER_EVENTS_SPOOL = os.environ.get('ORDER_EVENTS_SPOOL')
+
+ORDER_EVENTS_SPOOL_MAX_BYTES = 10 * 1024 * 1024
+
+KITCHEN_STREAM_MAX_SECONDS = 5 * 60
+
+ORDER_SLOT_DAY_START = '11:00'
+
+ORDER_SLOT_DAY_END = '23:00'
+
+ORDER_SLOT_MINUTES = 60
+
+ORDER_SLOT_CAPACITY = 15
+
+ORDER_SLOT_MAX_DAYS = 14
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
@@ -73,6 +111,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'mainapp.context_processors.cart_summary',
             ],
         },
     },